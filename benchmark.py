@@ -0,0 +1,366 @@
+"""性能测试
+
+用法:
+    python benchmark.py palette-index [--pixels 1000000] [--sizes 12,64,256,1024,4096]
+    python benchmark.py engines [--palettes 12,256,2048] [--metrics rgb,lab76]
+    python benchmark.py suite [--sizes 256,1mp,12mp,50mp] [--fixtures 图片文件夹]
+                              [--save-baseline baseline.json] [--baseline baseline.json]
+"""
+import argparse
+import gc
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from color_metrics import distance_matrix, to_space
+from palette_engine import (ENGINES, PRESET_COLORS, NumbaEngine, NumpyEngine, create_engine,
+                            parse_hex_colors)
+from palette_index import TreeEngine
+from pixel_art import generate_pixel_art
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 合成测试图像的尺寸 (宽, 高)
+SUITE_SIZES = {
+    '256': (256, 256),
+    '1mp': (1000, 1000),
+    '12mp': (4000, 3000),
+    '50mp': (8660, 5774),
+}
+
+# 测试项目：颜色简化映射、像素画生成、颜色提取
+SUITE_CASES = ('simplify', 'pixel-art', 'extract-main-color', 'extract-all-colors')
+
+# 非 rgb 距离的平局容限：所选颜色与最近颜色的距离（欧氏类为距离的平方）之差不超过该值时视为平局。
+# numpy 引擎用 float32 展开式计算，Lab 空间中距离平方的舍入误差约为 1e-3，远小于可察觉的色差
+TIE_TOLERANCE = 1e-2
+
+# 与基准相比吞吐量下降或内存增加超过该比例时视为退化
+DEFAULT_TOLERANCE = 0.15
+
+
+def _time(func, repeat=3):
+    """返回多次运行中最快的一次（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_palette_index(pixel_count=1_000_000, sizes=(12, 64, 256, 1024, 2048, 4096), metric="rgb",
+                        repeat=3, seed=0):
+    """比较暴力搜索和KD树在不同调色板大小下的速度，返回 [(调色板大小, 暴力秒数, KD树秒数)]"""
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, (pixel_count, 3), dtype=np.uint8)
+    results = []
+    for size in sizes:
+        palette = rng.integers(0, 256, (size, 3), dtype=np.uint8)
+        brute = NumpyEngine(palette, metric=metric)
+        tree = TreeEngine(palette, metric=metric)
+        results.append((size,
+                        _time(lambda: brute.map_indices(pixels), repeat),
+                        _time(lambda: tree.map_indices(pixels), repeat)))
+    return results
+
+
+def _print_palette_index(results, pixel_count):
+    print(f"{'调色板大小':>10} {'暴力 MP/s':>10} {'KD树 MP/s':>10}")
+    crossover = None
+    for size, brute, tree in results:
+        print(f"{size:>10} {pixel_count / brute / 1e6:>10.2f} {pixel_count / tree / 1e6:>10.2f}")
+        if crossover is None and tree < brute:
+            crossover = size
+    if crossover is None:
+        print("测试范围内KD树没有快于暴力搜索")
+    else:
+        print(f"KD树从 {crossover} 种颜色起快于暴力搜索")
+
+
+def _engine_test_pixels(palette, seed=0):
+    """一致性检查用的像素：合成图像、调色板颜色本身，以及两两颜色的中点（rgb 下恰好等距）"""
+    rng = np.random.default_rng(seed)
+    pairs = rng.integers(0, len(palette), (4096, 2))
+    midpoints = (palette[pairs[:, 0]].astype(np.uint16) + palette[pairs[:, 1]]) // 2
+    return np.concatenate([synthetic_image(512, 512, seed).reshape(-1, 3), palette,
+                           midpoints.astype(np.uint8)])
+
+
+def check_engines(palette_sizes=(12, 256, 2048), metrics=('rgb', 'lab76'), seed=0):
+    """检查各引擎的索引图与 numpy 引擎一致，返回 (结果列表, 不一致说明列表)
+
+    平局规则：rgb 下距离是整数，所有引擎必须逐像素相同（距离相等时取调色板中靠前的颜色）；
+    其他距离算法各引擎的浮点运算方式不同，允许在距离相差不超过 TIE_TOLERANCE 的颜色之间任选其一。
+    调色板最后一种颜色与第一种相同，用于检查重复颜色的平局处理。
+    """
+    rng = np.random.default_rng(seed)
+    results, mismatches = [], []
+    for size in palette_sizes:
+        palette = rng.integers(0, 256, (size, 3), dtype=np.uint8)
+        palette[-1] = palette[0]
+        pixels = _engine_test_pixels(palette, seed)
+        for metric in metrics:
+            reference = NumpyEngine(palette, metric=metric).map_indices(pixels)
+            for name in sorted(set(ENGINES) | {NumbaEngine.name}) + ["auto"]:
+                if name == NumbaEngine.name and name not in ENGINES:
+                    results.append({'engine': name, 'palette': size, 'metric': metric, 'skipped': "未安装"})
+                    continue
+                try:
+                    engine = create_engine(palette, name, metric=metric)
+                except ValueError as e:
+                    results.append({'engine': name, 'palette': size, 'metric': metric, 'skipped': str(e)})
+                    continue
+                engine.map_indices(pixels[:16])  # 预热：加载查找表、编译等
+                seconds = _time(lambda: engine.map_indices(pixels), repeat=1)
+                indices = engine.map_indices(pixels)
+                differ = np.flatnonzero(indices != reference)
+                if len(differ) and metric != 'rgb':
+                    # 只保留超出平局容限的像素
+                    points = to_space(metric, pixels[differ])
+                    dist = distance_matrix(metric, points, to_space(metric, palette))
+                    rows = np.arange(len(differ))
+                    best = dist.min(axis=1)
+                    limit = best + TIE_TOLERANCE
+                    differ = differ[(dist[rows, indices[differ]] > limit) |
+                                    (dist[rows, reference[differ]] > limit)]
+                if len(differ):
+                    mismatches.append(f"{name}/{metric}/{size}: {len(differ)} 个像素与 numpy 引擎不同")
+                results.append({'engine': name, 'palette': size, 'metric': metric,
+                                'mps': len(pixels) / seconds / 1e6, 'mismatches': int(len(differ))})
+    return results, mismatches
+
+
+def _print_engines(results):
+    print(f"{'引擎':<8} {'距离':<7} {'调色板':>6} {'MP/s':>8} {'不一致':>6}")
+    for r in results:
+        if 'skipped' in r:
+            print(f"{r['engine']:<8} {r['metric']:<7} {r['palette']:>6} 跳过（{r['skipped']}）")
+        else:
+            print(f"{r['engine']:<8} {r['metric']:<7} {r['palette']:>6} {r['mps']:>8.2f} {r['mismatches']:>6}")
+
+
+def synthetic_image(width, height, seed=0):
+    """可复现的合成测试图像：平滑渐变叠加少量噪声，颜色分布接近照片"""
+    rng = np.random.default_rng(seed)
+    freq = rng.uniform(0.002, 0.02, (3, 2)).astype(np.float32)
+    phase = rng.uniform(0, 2 * np.pi, 3).astype(np.float32)
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    x = np.arange(width, dtype=np.float32)
+    # 按行分块生成，避免大尺寸时的浮点中间结果占用过多内存
+    for top in range(0, height, 256):
+        y = np.arange(top, min(top + 256, height), dtype=np.float32)[:, None]
+        for c in range(3):
+            wave = np.sin(x * freq[c, 0] + y * freq[c, 1] + phase[c]) * 110 + 128
+            wave += rng.normal(0, 6, wave.shape).astype(np.float32)
+            img[top:top + len(y), :, c] = np.clip(wave, 0, 255)
+    return img
+
+
+def _suite_palette(size, seed=0):
+    """预设颜色，不足时补充随机颜色"""
+    palette = parse_hex_colors(PRESET_COLORS)[:size]
+    if len(palette) < size:
+        extra = np.random.default_rng(seed).integers(0, 256, (size - len(palette), 3), dtype=np.uint8)
+        palette = np.concatenate([palette, extra])
+    return palette
+
+
+def _suite_task(case, img_array, palette_size):
+    """返回 (要计时的函数, 计时结束后要删除的临时文件或None)；依赖缺失时抛出 ImportError"""
+    if case == 'simplify':
+        # 与 ColorSimplifierThread 默认相同的映射（自动选择引擎）
+        engine = create_engine(_suite_palette(palette_size), "auto")
+        return (lambda: engine.quantize(img_array)), None
+    if case == 'pixel-art':
+        # 与 PixelArtConverter 保存时相同的默认模式（平均色）
+        image = Image.fromarray(img_array)
+        return (lambda: generate_pixel_art(image, 16, "mean")), None
+
+    if case == 'extract-main-color':
+        extract = importlib.import_module('颜色画板').extract_main_color
+    else:
+        extract = importlib.import_module('颜色画板2').extract_all_colors
+    # 颜色提取函数读取文件，先写入未压缩的BMP
+    fd, path = tempfile.mkstemp(suffix='.bmp')
+    os.close(fd)
+    try:
+        Image.fromarray(img_array).save(path)
+    except Exception:
+        os.remove(path)
+        raise
+    return (lambda: extract(path)), path
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux以KB为单位，macOS以字节为单位
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+def _run_suite_case(case, source, palette_size, repeat):
+    """在独立子进程中运行单个测试，返回 (最快秒数, 峰值内存MB)
+
+    峰值内存优先取子进程的常驻内存峰值（包含输入图像以及Pillow、OpenCV的分配），
+    不支持时（Windows）取 tracemalloc 记录的Python/NumPy分配峰值。
+    """
+    if isinstance(source, str):
+        img = Image.open(source)
+        img_array = np.array(img.convert('RGB') if img.mode != 'RGB' else img)
+    else:
+        img_array = synthetic_image(*source)
+    func, temp_path = _suite_task(case, img_array, palette_size)
+    try:
+        func()  # 预热：查找表缓存、模块导入等
+
+        seconds = _time(func, repeat)
+        peak_mb = _peak_rss_mb()
+        if peak_mb is None:
+            gc.collect()
+            tracemalloc.start()
+            func()
+            _, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            peak_mb = traced_peak / (1 << 20)
+    finally:
+        if temp_path is not None:
+            os.remove(temp_path)
+    return seconds, peak_mb
+
+
+def bench_suite(sizes=('256', '1mp', '12mp', '50mp'), cases=SUITE_CASES, palette_sizes=(12, 256),
+                fixtures=(), repeat=3):
+    """运行测试套件，返回结果列表
+
+    每个测试在新的子进程中运行，互不影响内存统计；依赖缺失的测试记录为跳过。
+    """
+    sources = [(label, SUITE_SIZES[label]) for label in sizes]
+    sources += [(os.path.basename(path), path) for path in fixtures]
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for case in cases:
+        for label, source in sources:
+            for palette_size in (palette_sizes if case == 'simplify' else (None,)):
+                if isinstance(source, str):
+                    with Image.open(source) as img:
+                        pixels = img.width * img.height
+                else:
+                    pixels = source[0] * source[1]
+                result = {'case': case, 'size': label, 'palette': palette_size, 'pixels': pixels}
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    try:
+                        seconds, peak_mb = executor.submit(_run_suite_case, case, source, palette_size,
+                                                           repeat).result()
+                        result.update(seconds=seconds, mps=pixels / seconds / 1e6, peak_mb=peak_mb)
+                    except ImportError as e:
+                        result['skipped'] = f"缺少依赖: {e.name or e}"
+                results.append(result)
+    return results
+
+
+def _result_key(result):
+    return f"{result['case']}/{result['size']}/{result['palette']}"
+
+
+def compare_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """与基准结果比较，返回退化说明列表"""
+    previous = {_result_key(r): r for r in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(_result_key(result))
+        if old is None or 'skipped' in result or 'skipped' in old:
+            continue
+        if result['mps'] < old['mps'] * (1 - tolerance):
+            regressions.append(f"{_result_key(result)}: 吞吐量 {old['mps']:.2f} -> {result['mps']:.2f} MP/s")
+        if result['peak_mb'] > max(old['peak_mb'] * (1 + tolerance), old['peak_mb'] + 1):
+            regressions.append(f"{_result_key(result)}: 峰值内存 {old['peak_mb']:.1f} -> {result['peak_mb']:.1f} MB")
+    return regressions
+
+
+def _print_suite(results):
+    print(f"{'测试':<20} {'尺寸':>8} {'调色板':>6} {'秒':>8} {'MP/s':>8} {'峰值MB':>8}")
+    for r in results:
+        palette = '-' if r['palette'] is None else r['palette']
+        if 'skipped' in r:
+            print(f"{r['case']:<20} {r['size']:>8} {palette:>6} 跳过（{r['skipped']}）")
+        else:
+            print(f"{r['case']:<20} {r['size']:>8} {palette:>6} {r['seconds']:>8.3f} {r['mps']:>8.2f} "
+                  f"{r['peak_mb']:>8.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="颜色简化性能测试")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = sub.add_parser("palette-index", help="暴力搜索与KD树的交叉点")
+    index_parser.add_argument("--pixels", type=int, default=1_000_000, help="测试像素数")
+    index_parser.add_argument("--sizes", default="12,64,256,1024,2048,4096", help="调色板大小，用逗号分隔")
+    index_parser.add_argument("--metric", default="rgb", choices=("rgb", "lab76"))
+    index_parser.add_argument("--repeat", type=int, default=3)
+
+    engines_parser = sub.add_parser("engines", help="各映射引擎的速度，以及索引图是否与 numpy 引擎一致")
+    engines_parser.add_argument("--palettes", default="12,256,2048", help="调色板大小，用逗号分隔")
+    engines_parser.add_argument("--metrics", default="rgb,lab76", help="距离算法，用逗号分隔")
+
+    suite_parser = sub.add_parser("suite", help="颜色简化、像素画和颜色提取的吞吐量与峰值内存")
+    suite_parser.add_argument("--sizes", default="256,1mp,12mp,50mp",
+                              help=f"合成图像尺寸，用逗号分隔，可选 {','.join(SUITE_SIZES)}")
+    suite_parser.add_argument("--cases", default=",".join(SUITE_CASES), help="测试项目，用逗号分隔")
+    suite_parser.add_argument("--palettes", default="12,256", help="颜色简化测试的调色板大小")
+    suite_parser.add_argument("--fixtures", help="额外测试的图片文件夹（按原尺寸测试）")
+    suite_parser.add_argument("--repeat", type=int, default=3)
+    suite_parser.add_argument("--save-baseline", help="将结果保存为基准JSON")
+    suite_parser.add_argument("--baseline", help="与基准JSON比较，有退化时返回1")
+    suite_parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                              help=f"允许的退化比例（默认 {DEFAULT_TOLERANCE}）")
+
+    args = parser.parse_args(argv)
+    if args.command == "palette-index":
+        sizes = [int(s) for s in args.sizes.split(',')]
+        results = bench_palette_index(args.pixels, sizes, args.metric, args.repeat)
+        _print_palette_index(results, args.pixels)
+    elif args.command == "engines":
+        results, mismatches = check_engines([int(p) for p in args.palettes.split(',')],
+                                            args.metrics.split(','))
+        _print_engines(results)
+        for line in mismatches:
+            print(f"不一致: {line}")
+        return 1 if mismatches else 0
+    elif args.command == "suite":
+        fixtures = []
+        if args.fixtures:
+            # 延迟导入，避免子进程导入本模块时引入不必要的依赖
+            from simplify_batch import list_image_files
+            fixtures = sorted(list_image_files(args.fixtures))
+        results = bench_suite(args.sizes.split(','), args.cases.split(','),
+                              [int(p) for p in args.palettes.split(',')], fixtures, args.repeat)
+        _print_suite(results)
+        if args.save_baseline:
+            with open(args.save_baseline, 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f:
+                regressions = compare_baseline(results, json.load(f), args.tolerance)
+            for line in regressions:
+                print(f"退化: {line}")
+            return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
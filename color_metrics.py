@@ -0,0 +1,153 @@
+"""颜色距离算法（整块数组向量化计算）"""
+import numpy as np
+
+# 可选的距离算法
+#   rgb     - RGB欧氏距离
+#   redmean - 按红色均值加权的RGB距离（低成本的感知近似）
+#   lab76   - CIELAB欧氏距离（ΔE76）
+#   de2000  - CIEDE2000色差
+METRICS = ('rgb', 'redmean', 'lab76', 'de2000')
+
+# 距离可以展开为 像素特征 x 调色板系数 的算法，用矩阵乘法计算
+SEPARABLE_METRICS = ('rgb', 'redmean', 'lab76')
+
+# sRGB -> 线性RGB 查找表（每个通道只有256种取值）
+_SRGB_TO_LINEAR = np.array([
+    v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+    for v in (i / 255.0 for i in range(256))
+], dtype=np.float32)
+
+# 线性RGB -> XYZ（D65），每行已除以参考白点
+_RGB_TO_XYZ = (np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+]) / np.array([[0.95047], [1.0], [1.08883]])).astype(np.float32)
+
+_LAB_EPSILON = (6 / 29) ** 3
+
+
+def srgb_to_lab(rgb):
+    """将 (..., 3) 的uint8 sRGB数组转换为float32 CIELAB"""
+    rgb = np.asarray(rgb, dtype=np.uint8)
+    linear = _SRGB_TO_LINEAR[rgb.reshape(-1, 3)]
+    xyz = linear @ _RGB_TO_XYZ.T
+
+    # 暗部使用线性段，避免立方根在0附近的无穷斜率
+    f = np.where(xyz > _LAB_EPSILON, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    lab = np.empty_like(f)
+    lab[:, 0] = 116 * f[:, 1] - 16
+    lab[:, 1] = 500 * (f[:, 0] - f[:, 1])
+    lab[:, 2] = 200 * (f[:, 1] - f[:, 2])
+    return lab.reshape(rgb.shape)
+
+
+def to_space(metric, rgb):
+    """将uint8 RGB转换为该距离算法使用的颜色空间（float32）"""
+    if metric in ('lab76', 'de2000'):
+        return srgb_to_lab(rgb)
+    return np.asarray(rgb, dtype=np.float32)
+
+
+def redmean_distance(x, palette):
+    """加权RGB距离的平方，x为 (N, 3)，palette为 (P, 3)，返回 (N, P)"""
+    r_mean = (x[:, None, 0] + palette[None, :, 0]) * 0.5
+    diff = x[:, None, :] - palette[None, :, :]
+    diff *= diff
+    return ((2 + r_mean / 256) * diff[..., 0] + 4 * diff[..., 1] +
+            (2 + (255 - r_mean) / 256) * diff[..., 2])
+
+
+def separable_features(metric, rgb):
+    """可展开算法的像素特征 (N, K)
+
+    距离 = 特征 @ 系数 + 偏置，只含像素自身的项对所有调色板颜色相同，已省略。
+    """
+    if metric == 'redmean':
+        x = np.asarray(rgb, dtype=np.float64).reshape(-1, 3)
+        r, g, b = x[:, 0], x[:, 1], x[:, 2]
+        return np.stack([r, g, b, r * r, b * b, b * r], axis=1)
+    return to_space(metric, rgb).reshape(-1, 3)
+
+
+def separable_weights(metric, palette):
+    """可展开算法的调色板系数 (K, P) 和偏置 (P,)"""
+    if metric == 'redmean':
+        # 将 (2 + r̄/256)ΔR² + 4ΔG² + (2 + (255 - r̄)/256)ΔB² 按 r̄ = (R1 + R2) / 2 展开
+        c = np.asarray(palette, dtype=np.float64).reshape(-1, 3)
+        r, g, b = c[:, 0], c[:, 1], c[:, 2]
+        wb = 2 + 255 / 256
+        weights = np.stack([
+            -4 * r - (r * r + b * b) / 512,
+            -8 * g,
+            -2 * wb * b + b * r / 256,
+            -r / 512,
+            -r / 512,
+            b / 256,
+        ])
+        bias = 2 * r * r + 4 * g * g + wb * b * b + (r ** 3 - b * b * r) / 512
+        return weights, bias
+    colors = to_space(metric, palette).reshape(-1, 3)
+    return -2 * colors.T, (colors * colors).sum(axis=1)
+
+
+def delta_e2000(lab1, lab2):
+    """CIEDE2000色差，lab1为 (N, 3)，lab2为 (P, 3)，返回 (N, P)"""
+    L1, a1, b1 = (lab1[:, i:i + 1] for i in range(3))
+    L2, a2, b2 = (lab2[None, :, i] for i in range(3))
+
+    C1 = np.hypot(a1, b1)
+    C2 = np.hypot(a2, b2)
+    C_mean7 = ((C1 + C2) * 0.5) ** 7
+    G = 0.5 * (1 - np.sqrt(C_mean7 / (C_mean7 + 25.0 ** 7)))
+    a1p = a1 * (1 + G)
+    a2p = a2 * (1 + G)
+    C1p = np.hypot(a1p, b1)
+    C2p = np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+
+    dLp = L2 - L1
+    dCp = C2p - C1p
+    dhp = h2p - h1p
+    dhp = np.where(dhp > 180, dhp - 360, dhp)
+    dhp = np.where(dhp < -180, dhp + 360, dhp)
+    chroma_zero = (C1p * C2p) == 0
+    dhp = np.where(chroma_zero, 0, dhp)
+    dHp = 2 * np.sqrt(C1p * C2p) * np.sin(np.radians(dhp) * 0.5)
+
+    Lp_mean = (L1 + L2) * 0.5
+    Cp_mean = (C1p + C2p) * 0.5
+    hp_sum = h1p + h2p
+    hp_mean = np.where(np.abs(h1p - h2p) > 180,
+                       np.where(hp_sum < 360, hp_sum + 360, hp_sum - 360), hp_sum) * 0.5
+    hp_mean = np.where(chroma_zero, hp_sum, hp_mean)
+
+    T = (1 - 0.17 * np.cos(np.radians(hp_mean - 30)) + 0.24 * np.cos(np.radians(2 * hp_mean)) +
+         0.32 * np.cos(np.radians(3 * hp_mean + 6)) - 0.20 * np.cos(np.radians(4 * hp_mean - 63)))
+    d_theta = 30 * np.exp(-(((hp_mean - 275) / 25) ** 2))
+    Cp_mean7 = Cp_mean ** 7
+    R_C = 2 * np.sqrt(Cp_mean7 / (Cp_mean7 + 25.0 ** 7))
+    L50 = (Lp_mean - 50) ** 2
+    S_L = 1 + 0.015 * L50 / np.sqrt(20 + L50)
+    S_C = 1 + 0.045 * Cp_mean
+    S_H = 1 + 0.015 * Cp_mean * T
+    R_T = -np.sin(np.radians(2 * d_theta)) * R_C
+
+    dL = dLp / S_L
+    dC = dCp / S_C
+    dH = dHp / S_H
+    return np.sqrt(dL * dL + dC * dC + dH * dH + R_T * dC * dH)
+
+
+def distance_matrix(metric, x, palette):
+    """计算 (N, P) 的距离矩阵，x与palette需已用 to_space 转换
+
+    欧氏类算法返回距离的平方，只用于比较大小。
+    """
+    if metric == 'redmean':
+        return redmean_distance(x, palette)
+    if metric == 'de2000':
+        return delta_e2000(x, palette)
+    diff = x[:, None, :] - palette[None, :, :]
+    return np.einsum('npk,npk->np', diff, diff)
@@ -0,0 +1,178 @@
+"""抖动模式：有序抖动（Bayer）和误差扩散（Floyd–Steinberg、Atkinson）"""
+import time
+
+import numpy as np
+
+from palette_engine import index_dtype
+
+# 可选的抖动模式
+DITHER_MODES = ('none', 'bayer', 'floyd-steinberg', 'atkinson')
+
+# 误差扩散核：(行偏移, 列偏移, 权重)
+DIFFUSION_KERNELS = {
+    'floyd-steinberg': [(0, 1, 7 / 16), (1, -1, 3 / 16), (1, 0, 5 / 16), (1, 1, 1 / 16)],
+    'atkinson': [(0, 1, 1 / 8), (0, 2, 1 / 8), (1, -1, 1 / 8), (1, 0, 1 / 8), (1, 1, 1 / 8), (2, 0, 1 / 8)],
+}
+
+# 分块映射时每块的目标耗时（秒），即进度回调的间隔和停止的最大延迟
+PROGRESS_INTERVAL = 0.05
+
+# 分块映射时第一块的像素数（之后按实测速度调整）
+FIRST_CHUNK_PIXELS = 1 << 14
+
+# Bayer矩阵默认尺寸和抖动幅度（RGB数值）
+BAYER_SIZE = 8
+BAYER_SPREAD = 64
+
+
+def bayer_matrix(n=BAYER_SIZE):
+    """n x n 的Bayer阈值矩阵（n为2的幂），取值归一化到 [-0.5, 0.5)"""
+    matrix = np.zeros((1, 1), dtype=np.int64)
+    while len(matrix) < n:
+        matrix = np.block([[4 * matrix, 4 * matrix + 2], [4 * matrix + 3, 4 * matrix + 1]])
+    return (matrix + 0.5) / matrix.size - 0.5
+
+
+class BayerDither:
+    """有序抖动：每个像素加上位置相关的阈值偏移后映射，完全向量化"""
+
+    def __init__(self, engine, size=BAYER_SIZE, spread=BAYER_SPREAD):
+        self.engine = engine
+        self.spread = spread
+        self._matrix = (bayer_matrix(size) * spread).astype(np.float32)
+        self._row = 0  # 分条处理时已处理的行数，保证阈值矩阵在条带间连续
+
+    def map_indices(self, strip):
+        """将 (H, W, 3) 图像（或条带）映射为 (H, W) 的调色板索引"""
+        h, w, _ = strip.shape
+        n = len(self._matrix)
+        rows = (np.arange(h) + self._row) % n
+        cols = np.arange(w) % n
+        offset = self._matrix[rows[:, None], cols[None, :]][..., None]
+        self._row += h
+
+        shifted = np.clip(strip + offset, 0, 255)
+        shifted = np.rint(shifted, out=shifted).astype(np.uint8)
+        return self.engine.map_indices(shifted).reshape(h, w)
+
+
+class ErrorDiffusion:
+    """误差扩散抖动，按斜向波前逐批处理像素
+
+    像素 (y, x) 依赖的所有邻居在扩散核中都满足 列偏移 + 2 * 行偏移 > 0，
+    因此 x + 2y 相同的像素互不依赖，可以作为一批向量化处理，
+    结果与逐像素光栅顺序处理相同，步数只有 W + 2H。
+    跨条带时把溢出到下方的误差保留到下一条带。
+    """
+
+    def __init__(self, engine, mode='floyd-steinberg'):
+        if mode not in DIFFUSION_KERNELS:
+            raise ValueError(f"未知的误差扩散模式: {mode}")
+        self.engine = engine
+        self.kernel = DIFFUSION_KERNELS[mode]
+        self._palette = engine.palette.astype(np.float32)
+        self._depth = max(dy for dy, _, _ in self.kernel)
+        self._left = max(0, -min(dx for _, dx, _ in self.kernel))
+        self._right = max(dx for _, dx, _ in self.kernel)
+        self._carry = None  # 传递给下一条带的误差
+
+    def map_indices(self, strip, progress=None):
+        """将 (H, W, 3) 图像（或条带）映射为 (H, W) 的调色板索引
+
+        progress(已完成比例) 约每 PROGRESS_INTERVAL 秒调用一次，在其中抛出异常即可中止。
+        """
+        h, w, _ = strip.shape
+        if h == 0 or w == 0:
+            return np.zeros((h, w), dtype=index_dtype(len(self._palette)))
+        left = self._left
+        stride = w + left + self._right
+        buf = np.zeros((h + self._depth, stride, 3), dtype=np.float32)
+        buf[:h, left:left + w] = strip
+        if self._carry is not None:
+            buf[:self._depth, left:left + w] += self._carry
+        indices = np.zeros((h, stride), dtype=index_dtype(len(self._palette)))
+
+        # 展平后 x + 2y = t 的像素位于 t + left + y * (stride - 2)，是等间隔的切片（视图），
+        # 邻居同样是整体平移的切片，不需要花式索引
+        flat = buf.reshape(-1, 3)
+        flat_indices = indices.reshape(-1)
+        step = stride - 2
+        offsets = [(dy * stride + dx, weight) for dy, dx, weight in self.kernel]
+        done, total = 0, h * w
+        next_report = time.perf_counter() + PROGRESS_INTERVAL
+        for t in range(w + 2 * (h - 1)):
+            y0 = max(0, (t - w + 2) // 2)
+            y1 = min(h - 1, t // 2)
+            if progress is not None:
+                done += y1 - y0 + 1
+                if time.perf_counter() >= next_report:
+                    progress(done / total)
+                    next_report = time.perf_counter() + PROGRESS_INTERVAL
+            start = t + left + y0 * step
+            stop = t + left + y1 * step + 1
+            values = flat[start:stop:step]
+
+            clipped = np.clip(values, 0, 255)
+            idx = self.engine.map_indices(np.rint(clipped).astype(np.uint8))
+            flat_indices[start:stop:step] = idx
+
+            error = clipped - self._palette[idx]
+            for offset, weight in offsets:
+                target = flat[start + offset:stop + offset:step]
+                target += error * weight
+
+        self._carry = buf[h:, left:left + w].copy()
+        return indices[:, left:left + w]
+
+
+def create_ditherer(engine, mode):
+    """创建抖动器，mode为 'none' 时返回None"""
+    if mode in (None, 'none'):
+        return None
+    if mode == 'bayer':
+        return BayerDither(engine)
+    return ErrorDiffusion(engine, mode)
+
+
+def timed_rows(height, width, interval=PROGRESS_INTERVAL, first_pixels=FIRST_CHUNK_PIXELS):
+    """将 height 行切分为 (top, bottom) 块，按上一块的实测耗时调整行数，使每块约耗时 interval 秒"""
+    rows = max(1, first_pixels // max(width, 1))
+    top = 0
+    while top < height:
+        bottom = min(height, top + rows)
+        start = time.perf_counter()
+        yield top, bottom
+        elapsed = time.perf_counter() - start
+        # 每次最多增大4倍，避免偶然的快块导致下一块过大
+        rows = max(1, min(int((bottom - top) * interval / max(elapsed, 1e-6)), rows * 4))
+        top = bottom
+
+
+def map_strip(strip, engine, ditherer=None, progress=None):
+    """用抖动器（None为不抖动）将 (H, W, 3) 条带映射为 (H, W) 的调色板索引
+
+    传入 progress 时分块处理，progress(已完成比例) 约每 PROGRESS_INTERVAL 秒调用一次，
+    在其中抛出异常即可中止。误差扩散在波前之间检查，不切分条带，以免增加波前步数。
+    """
+    h, w = strip.shape[:2]
+    if progress is None:
+        if ditherer is None:
+            return engine.map_indices(strip).reshape(h, w)
+        return ditherer.map_indices(strip)
+    if isinstance(ditherer, ErrorDiffusion):
+        return ditherer.map_indices(strip, progress)
+
+    indices = np.empty((h, w), dtype=index_dtype(len(engine.palette)))
+    for top, bottom in timed_rows(h, w):
+        part = strip[top:bottom]
+        if ditherer is None:
+            indices[top:bottom] = engine.map_indices(part).reshape(bottom - top, w)
+        else:
+            indices[top:bottom] = ditherer.map_indices(part)
+        progress(bottom / h)
+    return indices
+
+
+def dither_indices(img_array, engine, mode, progress=None):
+    """对整张 (H, W, 3) 图像抖动映射，返回 (H, W) 的调色板索引（progress 见 map_strip）"""
+    return map_strip(img_array, engine, create_ditherer(engine, mode), progress)
@@ -0,0 +1,202 @@
+"""批量处理的性能记录：每个文件各阶段的耗时、读写字节数、像素数，以及可选的性能分析钩子"""
+import collections
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import warnings
+from contextlib import contextmanager
+
+# 记录的阶段：解码、转换为RGB、颜色映射、编码保存；超大图像分条带处理时只有 stream 阶段
+STAGES = ('decode', 'convert', 'quantize', 'encode', 'stream')
+
+
+def _check_stage(stage):
+    if stage not in STAGES:
+        raise ValueError(f"未知的阶段: {stage}（可选: {', '.join(STAGES)}）")
+
+
+class FileMetrics:
+    """单个文件的性能记录，各阶段可在不同线程中记录，阶段名必须在 STAGES 中"""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.stages = {}  # 阶段 -> {'wall': 秒, 'cpu': 秒}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.pixels = 0
+        self.error = None
+
+    def add(self, stage, wall, cpu):
+        _check_stage(stage)
+        timing = self.stages.setdefault(stage, {'wall': 0.0, 'cpu': 0.0})
+        timing['wall'] += wall
+        timing['cpu'] += cpu
+
+    @contextmanager
+    def measure(self, stage):
+        """记录代码块的墙钟时间和当前线程的CPU时间"""
+        _check_stage(stage)
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - wall, time.thread_time() - cpu)
+
+    def to_dict(self):
+        return {
+            'file': self.file_path,
+            'stages': self.stages,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'pixels': self.pixels,
+            'error': self.error,
+        }
+
+
+class JsonLinesSink:
+    """将每个文件的记录写为一行JSON，path 为 '-' 时写到标准错误"""
+
+    def __init__(self, path):
+        self._own = path != '-'
+        self._file = open(path, 'a', encoding='utf-8') if self._own else sys.stderr
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self):
+        if self._own:
+            self._file.close()
+
+
+class StageTotals:
+    """汇总所有文件各阶段的耗时，找出瓶颈"""
+
+    def __init__(self):
+        self.stages = {}
+        self.files = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.pixels = 0
+
+    def __call__(self, record):
+        self.files += 1
+        self.bytes_read += record['bytes_read']
+        self.bytes_written += record['bytes_written']
+        self.pixels += record['pixels']
+        for stage, timing in record['stages'].items():
+            total = self.stages.setdefault(stage, {'wall': 0.0, 'cpu': 0.0})
+            total['wall'] += timing['wall']
+            total['cpu'] += timing['cpu']
+
+    def summary(self):
+        parts = [f"{stage} {t['wall']:.2f}s (CPU {t['cpu']:.2f}s)"
+                 for stage, t in sorted(self.stages.items(), key=lambda item: -item[1]['wall'])]
+        return (f"{self.files} 个文件, {self.pixels / 1e6:.1f} MP, 读 {self.bytes_read / 1e6:.1f} MB, "
+                f"写 {self.bytes_written / 1e6:.1f} MB; " + ", ".join(parts))
+
+
+# Python 3.12 起cProfile基于 sys.monitoring，每个进程同时只能启用一个分析器，不能在多个线程中同时分析
+CPROFILE_PER_THREAD = sys.version_info < (3, 12)
+
+
+class StageProfiler:
+    """cProfile钩子：每个线程一个分析器，只分析流水线各阶段函数的调用，结束时合并写出
+
+    映射阶段在子进程中运行时（workers > 1）子进程内的调用不在分析范围内。
+    只能在 CPROFILE_PER_THREAD 为True（Python 3.12 以前）时使用，否则用 create_profiler 改为采样分析。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    def wrap(self, func):
+        def profiled(*args):
+            profile = getattr(self._local, 'profile', None)
+            if profile is None:
+                profile = self._local.profile = cProfile.Profile()
+                with self._lock:
+                    self._profiles.append(profile)
+            return profile.runcall(func, *args)
+        return profiled
+
+    def start(self):
+        pass
+
+    def stop(self):
+        with self._lock:
+            profiles = list(self._profiles)
+        if profiles:
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(self.path)
+
+
+class SamplingProfiler:
+    """采样分析器：后台线程定时记录所有线程的调用栈，结束时写出折叠栈格式（可用 flamegraph.pl 绘制）
+
+    开销与调用次数无关，适合分析长时间运行的批量任务。
+    """
+
+    def __init__(self, path, interval=0.005):
+        self.path = path
+        self.interval = interval
+        self.samples = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def wrap(self, func):
+        return func
+
+    def _sample(self):
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with open(self.path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def create_profiler(kind, path):
+    """kind 为 'cprofile' 或 'sample'；Python 3.12+ 上 cprofile 改用采样分析并给出警告"""
+    if kind == 'cprofile':
+        if CPROFILE_PER_THREAD:
+            return StageProfiler(path)
+        warnings.warn("Python 3.12+ 不支持在多个线程中同时使用cProfile，改用采样分析（输出为折叠栈文本）")
+        kind = 'sample'
+    if kind == 'sample':
+        return SamplingProfiler(path)
+    raise ValueError(f"未知的性能分析方式: {kind}")
@@ -1,11 +1,48 @@
 import sys
 import os
-from PIL import Image
-import numpy as np
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
-                             QPushButton, QFileDialog, QProgressBar, QGroupBox, QListWidget, QMessageBox)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
-from PyQt5.QtGui import QColor, QPalette, QPixmap, QIcon, QPainter  # 添加了QPainter导入
+                             QPushButton, QFileDialog, QProgressBar, QGroupBox, QListWidget, QMessageBox,
+                             QSpinBox, QComboBox, QCheckBox, QInputDialog)
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
+from PyQt5.QtGui import QColor, QPalette, QPixmap, QIcon, QImage, QPainter  # 添加了QPainter导入
+
+from palette_engine import ENGINES, check_engine, parse_hex_colors
+from instrumentation import StageTotals
+from manifest import Manifest
+from palette_library import PaletteLibrary
+from preview import PreviewService
+from scanner import ImageScanner
+from simplify_batch import output_path_for, process_files
+from tile_stream import DEFAULT_BUDGET_MB
+
+# 颜色距离算法的显示名称
+METRIC_NAMES = {
+    "rgb": "RGB欧氏距离",
+    "redmean": "加权RGB (redmean)",
+    "lab76": "CIELAB ΔE76",
+    "de2000": "CIEDE2000",
+}
+
+# 抖动模式在界面中显示的名称
+DITHER_NAMES = {
+    "none": "无",
+    "bayer": "有序抖动 (Bayer)",
+    "floyd-steinberg": "Floyd–Steinberg",
+    "atkinson": "Atkinson",
+}
+
+# 映射引擎在界面中显示的名称（未安装 numba 时不显示 numba 引擎）
+ENGINE_NAMES = {
+    "auto": "自动",
+    "lut": "查找表",
+    "pillow": "Pillow (仅RGB距离)",
+    "numpy": "NumPy暴力搜索",
+    "kdtree": "KD树",
+    "numba": "Numba (仅RGB距离)",
+}
+
+# 调色板或选项变化后等待的毫秒数，连续修改时只渲染最后一次
+PREVIEW_DEBOUNCE_MS = 30
 
 
 class ColorSimplifierThread(QThread):
@@ -13,90 +50,107 @@ class ColorSimplifierThread(QThread):
     file_processed = pyqtSignal(str)
     finished = pyqtSignal()
     error_occurred = pyqtSignal(str)
+    metrics_recorded = pyqtSignal(dict)  # 每个文件各阶段的耗时、读写字节数和像素数（见 instrumentation.FileMetrics）
 
-    def __init__(self, input_path, output_folder, color_hex_list, is_folder):
+    def __init__(self, input_path, output_folder, color_hex_list, is_folder, engine="numpy", workers=1,
+                 memory_budget_mb=DEFAULT_BUDGET_MB, metric="rgb", dither="none", incremental=True,
+                 recursive=True, indexed=True):
         super().__init__()
         self.input_path = input_path
         self.output_folder = output_folder
         self.color_hex_list = color_hex_list
         self.is_folder = is_folder
+        self.engine = engine
+        self.workers = workers  # 处理文件夹时的进程数
+        self.memory_budget_mb = memory_budget_mb  # 单张图像的内存预算，超出时分条带处理
+        self.metric = metric  # 颜色距离算法
+        self.dither = dither  # 抖动模式
+        self.indexed = indexed  # 支持的格式保存为索引色图像
+        self.incremental = incremental  # 跳过输出文件夹清单中记录的未变化文件
+        self.recursive = recursive  # 处理文件夹时包含子文件夹
         self.running = True
 
     def run(self):
         try:
             # 将16进制颜色代码转换为RGB值
-            palette = []
-            for hex_color in self.color_hex_list:
-                hex_color = hex_color.strip().lstrip('#')
-                if len(hex_color) == 3:
-                    hex_color = ''.join([c * 2 for c in hex_color])
-                rgb = tuple(int(hex_color[i:i + 2], 16) for i in (0, 2, 4))
-                palette.append(rgb)
-
-            if not palette:
+            palette = parse_hex_colors(self.color_hex_list)
+
+            if len(palette) == 0:
                 self.error_occurred.emit("没有有效的颜色代码！")
                 return
 
-            # 处理输入（文件夹或文件）
+            # 处理输入（文件夹或文件）；文件夹边扫描边处理，输出时保留子文件夹结构
             if self.is_folder:
-                files = [os.path.join(self.input_path, f) for f in os.listdir(self.input_path)
-                         if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif'))]
+                scanner = ImageScanner(self.input_path, self.recursive, skip_dirs=(self.output_folder,))
+                files = scanner
+                root = self.input_path
+                workers = self.workers
             else:
+                scanner = None
                 files = [self.input_path]
+                root = None
+                workers = 1
+
+            def output_path(file_path):
+                return output_path_for(file_path, self.output_folder, root)
+
+            # 跳过内容、调色板和设置都未变化的文件，只处理新文件和上次失败的文件
+            manifest = None
+            if self.incremental:
+                settings = {"metric": self.metric, "dither": self.dither, "indexed": self.indexed}
+                manifest = Manifest(self.output_folder, palette, settings)
+                files = manifest.filter_pending(files, output_path)
+
+            processed = 0
+            partial = {}  # 正在映射的文件 -> 完成比例
+            completed = set()
+            last_percent = [-1]
+
+            def emit_progress():
+                # 扫描尚未结束时按目前已发现的文件数计算进度，正在处理的文件按完成比例计入
+                done = processed + (manifest.skipped if manifest else 0)
+                total = scanner.count if scanner is not None else 1
+                percent = int((done + sum(list(partial.values()))) / max(total, done, 1) * 100)
+                if percent != last_percent[0]:
+                    last_percent[0] = percent
+                    self.progress_updated.emit(min(percent, 100))
+
+            def file_progress(file_path, fraction):
+                # 由流水线线程调用；多进程时进度可能在文件完成后才到达
+                if self.running and file_path not in completed:
+                    partial[file_path] = fraction
+                    emit_progress()
+
+            try:
+                # 按完成顺序接收结果（多进程时顺序可能与文件列表不同）
+                results = process_files(files, self.output_folder, palette, self.engine, workers,
+                                        should_stop=lambda: not self.running,
+                                        engine_options={"metric": self.metric},
+                                        memory_budget_mb=self.memory_budget_mb,
+                                        dither=self.dither, indexed=self.indexed, manifest=manifest,
+                                        output_path_func=output_path,
+                                        metrics_callback=self.metrics_recorded.emit,
+                                        progress_callback=file_progress)
+                for file_path, error in results:
+                    processed += 1
+                    completed.add(file_path)
+                    partial.pop(file_path, None)
+                    if error is None:
+                        self.file_processed.emit(os.path.basename(file_path))
+                    else:
+                        self.error_occurred.emit(f"处理 {os.path.basename(file_path)} 时出错: {error}")
+                    emit_progress()
+            finally:
+                if manifest is not None:
+                    manifest.close()
 
-            total_files = len(files)
-
-            for idx, file_path in enumerate(files):
-                if not self.running:
-                    break
+            if manifest is not None and manifest.skipped:
+                self.file_processed.emit(f"跳过 {manifest.skipped} 个未变化的文件")
+            if self.running:
+                self.progress_updated.emit(100)
 
-                try:
-                    # 处理单个图像
-                    img = Image.open(file_path)
-                    if img.mode != 'RGB':
-                        img = img.convert('RGB')
-
-                    img_array = np.array(img)
-
-                    # 创建一个新数组来存储简化后的图像
-                    simplified_array = np.zeros_like(img_array)
-
-                    # 遍历所有像素，找到最接近的颜色
-                    height, width, _ = img_array.shape
-                    for y in range(height):
-                        for x in range(width):
-                            pixel = img_array[y, x]
-                            min_dist = float('inf')
-                            best_color = palette[0]
-
-                            for color in palette:
-                                # 计算颜色距离（欧氏距离）
-                                dist = np.sqrt(
-                                    (pixel[0] - color[0]) ** 2 +
-                                    (pixel[1] - color[1]) ** 2 +
-                                    (pixel[2] - color[2]) ** 2
-                                )
-                                if dist < min_dist:
-                                    min_dist = dist
-                                    best_color = color
-
-                            simplified_array[y, x] = best_color
-
-                    # 保存结果
-                    output_path = os.path.join(
-                        self.output_folder,
-                        f"simplified_{os.path.basename(file_path)}"
-                    )
-                    simplified_img = Image.fromarray(simplified_array)
-                    simplified_img.save(output_path)
-
-                    self.file_processed.emit(os.path.basename(file_path))
-                    self.progress_updated.emit(int((idx + 1) / total_files * 100))
-
-                except Exception as e:
-                    self.error_occurred.emit(f"处理 {os.path.basename(file_path)} 时出错: {str(e)}")
-
-            self.finished.emit()
+            if self.running:
+                self.finished.emit()
 
         except Exception as e:
             self.error_occurred.emit(f"处理过程中出错: {str(e)}")
@@ -105,7 +159,29 @@ class ColorSimplifierThread(QThread):
         self.running = False
 
 
+class PaletteSaveThread(QThread):
+    """在后台保存调色板并构建查找表（非 rgb 距离的完整查找表首次构建需要数秒到数分钟）"""
+    saved = pyqtSignal(str)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, library, name, colors, metric):
+        super().__init__()
+        self.library = library
+        self.name = name
+        self.colors = colors
+        self.metric = metric
+
+    def run(self):
+        try:
+            self.library.save(self.name, self.colors, metrics=(self.metric,))
+            self.saved.emit(self.name)
+        except (OSError, ValueError) as e:
+            self.error_occurred.emit(f"保存调色板时出错: {e}")
+
+
 class ColorSimplifierApp(QMainWindow):
+    preview_ready = pyqtSignal(int, object, object)  # 请求编号, 预览图像, 错误信息（由预览线程发出）
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("颜色简化程序")
@@ -119,6 +195,16 @@ class ColorSimplifierApp(QMainWindow):
         self.output_folder = ""
         self.color_hex_list = []
         self.worker_thread = None
+        self.palette_library = PaletteLibrary()
+        self.palette_thread = None
+        self.preview_path = ""  # 预览的图片（选择文件夹时为其中第一张）
+        self.preview_generation = 0
+        self.preview_service = PreviewService(self.preview_ready.emit)
+        self.preview_ready.connect(self.show_preview)
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_DEBOUNCE_MS)
+        self.preview_timer.timeout.connect(self.request_preview)
 
         # 创建UI
         self.init_ui()
@@ -196,6 +282,23 @@ class ColorSimplifierApp(QMainWindow):
         output_layout.addWidget(output_btn)
 
         input_layout.addLayout(output_layout)
+
+        # 并行进程数（仅处理文件夹时生效）
+        workers_layout = QHBoxLayout()
+        workers_layout.addWidget(QLabel("并行进程数:"))
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, os.cpu_count() or 1)
+        self.workers_spin.setValue(os.cpu_count() or 1)
+        workers_layout.addWidget(self.workers_spin)
+        self.incremental_check = QCheckBox("跳过未变化的文件")
+        self.incremental_check.setChecked(True)
+        workers_layout.addWidget(self.incremental_check)
+        self.recursive_check = QCheckBox("包含子文件夹")
+        self.recursive_check.setChecked(True)
+        workers_layout.addWidget(self.recursive_check)
+        workers_layout.addStretch()
+        input_layout.addLayout(workers_layout)
+
         input_group.setLayout(input_layout)
         main_layout.addWidget(input_group)
 
@@ -216,22 +319,78 @@ class ColorSimplifierApp(QMainWindow):
 
         color_layout.addLayout(color_input_layout)
 
-        # 颜色列表
+        # 颜色列表和预览
+        list_layout = QHBoxLayout()
         self.color_list = QListWidget()
         self.color_list.setStyleSheet("background-color: #f0f0f0;")
-        color_layout.addWidget(self.color_list)
+        self.color_list.setSelectionMode(QListWidget.ExtendedSelection)
+        list_layout.addWidget(self.color_list)
 
-        # 颜色按钮
+        self.preview_label = QLabel("选择图片后显示预览")
+        self.preview_label.setAlignment(Qt.AlignCenter)
+        self.preview_label.setMinimumSize(256, 256)
+        self.preview_label.setStyleSheet("border: 1px solid #aaa; color: #777;")
+        list_layout.addWidget(self.preview_label)
+        color_layout.addLayout(list_layout)
+
+        # 颜色按钮和调色板库
         color_btn_layout = QHBoxLayout()
-        preset_btn = QPushButton("预设颜色")
-        preset_btn.clicked.connect(self.add_preset_colors)
-        color_btn_layout.addWidget(preset_btn)
+        color_btn_layout.addWidget(QLabel("调色板库:"))
+        self.palette_combo = QComboBox()
+        self.refresh_palette_combo()
+        color_btn_layout.addWidget(self.palette_combo)
+
+        load_palette_btn = QPushButton("载入")
+        load_palette_btn.clicked.connect(self.load_palette)
+        color_btn_layout.addWidget(load_palette_btn)
+
+        save_palette_btn = QPushButton("保存为...")
+        save_palette_btn.setToolTip("保存当前颜色，并为当前距离算法预先构建查找表")
+        save_palette_btn.clicked.connect(self.save_palette)
+        color_btn_layout.addWidget(save_palette_btn)
+
+        delete_palette_btn = QPushButton("删除")
+        delete_palette_btn.clicked.connect(self.delete_palette)
+        color_btn_layout.addWidget(delete_palette_btn)
+
+        remove_btn = QPushButton("删除所选颜色")
+        remove_btn.clicked.connect(self.remove_selected_colors)
+        color_btn_layout.addWidget(remove_btn)
 
         clear_btn = QPushButton("清空颜色")
         clear_btn.clicked.connect(self.clear_colors)
         color_btn_layout.addWidget(clear_btn)
 
         color_layout.addLayout(color_btn_layout)
+
+        # 颜色距离算法
+        metric_layout = QHBoxLayout()
+        metric_layout.addWidget(QLabel("距离算法:"))
+        self.metric_combo = QComboBox()
+        for metric, name in METRIC_NAMES.items():
+            self.metric_combo.addItem(name, metric)
+        self.metric_combo.currentIndexChanged.connect(self.schedule_preview)
+        metric_layout.addWidget(self.metric_combo)
+        metric_layout.addWidget(QLabel("引擎:"))
+        self.engine_combo = QComboBox()
+        for engine, name in ENGINE_NAMES.items():
+            if engine == "auto" or engine in ENGINES:
+                self.engine_combo.addItem(name, engine)
+        self.engine_combo.setToolTip("各引擎结果相同，只影响速度；自动按图像和调色板大小选择")
+        self.metric_combo.currentIndexChanged.connect(self.update_engine_choices)
+        metric_layout.addWidget(self.engine_combo)
+        metric_layout.addWidget(QLabel("抖动:"))
+        self.dither_combo = QComboBox()
+        for mode, name in DITHER_NAMES.items():
+            self.dither_combo.addItem(name, mode)
+        self.dither_combo.currentIndexChanged.connect(self.schedule_preview)
+        metric_layout.addWidget(self.dither_combo)
+        self.indexed_check = QCheckBox("索引色输出")
+        self.indexed_check.setChecked(True)
+        self.indexed_check.setToolTip("PNG/GIF/BMP/TIFF保存为内嵌调色板的索引色图像（最多256色），文件更小")
+        metric_layout.addWidget(self.indexed_check)
+        metric_layout.addStretch()
+        color_layout.addLayout(metric_layout)
         color_group.setLayout(color_layout)
         main_layout.addWidget(color_group)
 
@@ -328,6 +487,8 @@ class ColorSimplifierApp(QMainWindow):
             self.input_path = file
             self.input_label.setText(f"已选择文件: {os.path.basename(file)}")
             self.input_label.setToolTip(file)
+            self.preview_path = file
+            self.schedule_preview()
 
     def select_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "选择图片文件夹")
@@ -335,6 +496,9 @@ class ColorSimplifierApp(QMainWindow):
             self.input_path = folder
             self.input_label.setText(f"已选择文件夹: {os.path.basename(folder)}")
             self.input_label.setToolTip(folder)
+            # 预览文件夹中找到的第一张图片
+            self.preview_path = next(iter(ImageScanner(folder, recursive=False)), "")
+            self.schedule_preview()
 
     def select_output_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "选择输出文件夹")
@@ -365,19 +529,72 @@ class ColorSimplifierApp(QMainWindow):
             self.update_color_list()
             self.color_input.clear()
 
-    def add_preset_colors(self):
-        preset_colors = [
-            "#FF0000", "#00FF00", "#0000FF",  # 三原色
-            "#FFFF00", "#FF00FF", "#00FFFF",  # 二次色
-            "#000000", "#FFFFFF", "#808080",  # 黑白灰
-            "#FFA500", "#800080", "#008000"  # 橙紫绿
-        ]
-        self.color_hex_list.extend(preset_colors)
-        self.update_color_list()
+    def refresh_palette_combo(self, current=None):
+        current = current or self.palette_combo.currentText()
+        self.palette_combo.clear()
+        self.palette_combo.addItems(self.palette_library.names())
+        if current:
+            index = self.palette_combo.findText(current)
+            if index >= 0:
+                self.palette_combo.setCurrentIndex(index)
+
+    def load_palette(self):
+        name = self.palette_combo.currentText()
+        if name:
+            self.color_hex_list = self.palette_library.colors(name)
+            self.update_color_list()
+
+    def save_palette(self):
+        if not self.color_hex_list:
+            QMessageBox.warning(self, "警告", "请先添加颜色！")
+            return
+        if self.palette_thread is not None and self.palette_thread.isRunning():
+            QMessageBox.warning(self, "警告", "正在保存调色板，请稍候")
+            return
+        name, ok = QInputDialog.getText(self, "保存调色板", "调色板名称:", text=self.palette_combo.currentText())
+        if not ok or not name.strip():
+            return
+        self.status_label.setText(f"正在保存调色板“{name.strip()}”并构建查找表...")
+        self.palette_thread = PaletteSaveThread(self.palette_library, name.strip(), list(self.color_hex_list),
+                                                self.metric_combo.currentData())
+        self.palette_thread.saved.connect(self.palette_saved)
+        self.palette_thread.error_occurred.connect(self.handle_palette_error)
+        self.palette_thread.start()
+
+    def palette_saved(self, name):
+        self.refresh_palette_combo(name)
+        self.status_label.setText(f"调色板“{name}”已保存")
+
+    def handle_palette_error(self, error_msg):
+        QMessageBox.critical(self, "错误", error_msg)
+        self.status_label.setText("就绪")
+
+    def delete_palette(self):
+        name = self.palette_combo.currentText()
+        if not name:
+            return
+        if self.palette_thread is not None and self.palette_thread.isRunning():
+            QMessageBox.warning(self, "警告", "正在保存调色板，请稍候")
+            return
+        if QMessageBox.question(self, "删除调色板", f"删除调色板“{name}”？") != QMessageBox.Yes:
+            return
+        try:
+            self.palette_library.delete(name)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "无法删除", str(e))
+            return
+        self.refresh_palette_combo()
+
+    def remove_selected_colors(self):
+        rows = {self.color_list.row(item) for item in self.color_list.selectedItems()}
+        if rows:
+            self.color_hex_list = [c for i, c in enumerate(self.color_hex_list) if i not in rows]
+            self.update_color_list()
 
     def clear_colors(self):
         self.color_hex_list = []
         self.color_list.clear()
+        self.schedule_preview()
 
     def update_color_list(self):
         self.color_list.clear()
@@ -392,6 +609,54 @@ class ColorSimplifierApp(QMainWindow):
                 item.setForeground(Qt.white)
             else:
                 item.setForeground(Qt.black)
+        self.schedule_preview()
+
+    def schedule_preview(self):
+        self.preview_timer.start()
+
+    def request_preview(self):
+        if not self.preview_path:
+            return
+        if not self.color_hex_list:
+            self.preview_generation = 0
+            self.preview_label.setText("添加颜色后显示预览")
+            return
+        try:
+            palette = parse_hex_colors(self.color_hex_list)
+        except ValueError:
+            return
+        self.preview_generation = self.preview_service.request(
+            self.preview_path, palette, self.metric_combo.currentData(), self.dither_combo.currentData())
+
+    def show_preview(self, generation, image, error):
+        if generation != self.preview_generation:
+            return  # 已有更新的请求
+        if error is not None:
+            self.preview_label.setText(f"无法预览: {error}")
+            return
+        height, width = image.shape[:2]
+        qimage = QImage(image.data, width, height, 3 * width, QImage.Format_RGB888).copy()
+        pixmap = QPixmap.fromImage(qimage).scaled(self.preview_label.size(), Qt.KeepAspectRatio,
+                                                  Qt.FastTransformation)
+        self.preview_label.setPixmap(pixmap)
+
+    def closeEvent(self, event):
+        self.preview_service.close()
+        super().closeEvent(event)
+
+    def update_engine_choices(self):
+        """禁用不支持当前距离算法的引擎（pillow、numba 只支持 rgb 距离），当前引擎不可用时改为自动"""
+        metric = self.metric_combo.currentData()
+        model = self.engine_combo.model()
+        for i in range(self.engine_combo.count()):
+            try:
+                check_engine(self.engine_combo.itemData(i), 0, metric)
+                supported = True
+            except ValueError:
+                supported = False
+            model.item(i).setEnabled(supported)
+            if not supported and i == self.engine_combo.currentIndex():
+                self.engine_combo.setCurrentIndex(self.engine_combo.findData("auto"))
 
     def validate_inputs(self):
         if not self.input_path:
@@ -406,6 +671,14 @@ class ColorSimplifierApp(QMainWindow):
             QMessageBox.warning(self, "颜色错误", "请添加至少一个颜色代码")
             return False
 
+        # 与命令行相同，在启动前拒绝不支持的引擎组合（如 pillow 引擎超过256种颜色）
+        try:
+            check_engine(self.engine_combo.currentData(), len(parse_hex_colors(self.color_hex_list)),
+                         self.metric_combo.currentData())
+        except ValueError as e:
+            QMessageBox.warning(self, "引擎错误", str(e))
+            return False
+
         return True
 
     def start_processing(self):
@@ -433,7 +706,14 @@ class ColorSimplifierApp(QMainWindow):
             self.input_path,
             self.output_folder,
             self.color_hex_list,
-            is_folder
+            is_folder,
+            engine=self.engine_combo.currentData(),
+            workers=self.workers_spin.value(),
+            metric=self.metric_combo.currentData(),
+            dither=self.dither_combo.currentData(),
+            indexed=self.indexed_check.isChecked(),
+            incremental=self.incremental_check.isChecked(),
+            recursive=self.recursive_check.isChecked()
         )
 
         # 连接信号
@@ -441,6 +721,8 @@ class ColorSimplifierApp(QMainWindow):
         self.worker_thread.file_processed.connect(self.update_status)
         self.worker_thread.finished.connect(self.processing_finished)
         self.worker_thread.error_occurred.connect(self.handle_error)
+        self.stage_totals = StageTotals()
+        self.worker_thread.metrics_recorded.connect(self.stage_totals)
 
         self.worker_thread.start()
 
@@ -459,7 +741,8 @@ class ColorSimplifierApp(QMainWindow):
         self.status_label.setText(f"处理完成: {filename}")
 
     def processing_finished(self):
-        self.status_label.setText("处理完成！")
+        # 显示各阶段累计耗时，便于判断瓶颈
+        self.status_label.setText(f"处理完成！{self.stage_totals.summary()}")
         self.process_btn.setEnabled(True)
         QMessageBox.information(self, "完成", "所有图片处理完成！")
 
@@ -0,0 +1,145 @@
+"""批量处理清单：记录每个输入文件的内容哈希、调色板、设置和输出路径，重新运行时跳过未变化的文件"""
+import hashlib
+import json
+import os
+import tempfile
+
+from palette_engine import palette_hash
+
+# 清单文件名（保存在输出文件夹中）
+MANIFEST_NAME = ".simplify_manifest.jsonl"
+
+# 计算内容哈希时每次读取的字节数
+_HASH_BLOCK = 1 << 20
+
+
+def file_digest(path):
+    """文件内容的哈希值"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """追加写入的JSON Lines清单，同一输入文件以最后一条记录为准
+
+    每处理完一个文件立即追加一行，中途停止或崩溃后已完成的记录不会丢失。
+    文件大小和修改时间未变时直接沿用记录中的哈希，不重新读取文件内容。
+    """
+
+    def __init__(self, output_folder, palette, settings=None):
+        self.path = os.path.join(output_folder, MANIFEST_NAME)
+        self.palette = palette_hash(palette)
+        self.settings = dict(settings or {})
+        self.records = {}
+        self.skipped = 0
+        self._lines = 0
+        self._pending = {}  # 检查时已计算的 (size, mtime_ns, hash)，记录结果时复用
+        self._load()
+        self._file = None
+
+    @staticmethod
+    def _key(file_path):
+        return os.path.abspath(file_path)
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        self.records[record['input']] = record
+                    except (ValueError, KeyError, TypeError):
+                        continue  # 崩溃时可能留下写了一半的最后一行
+                    self._lines += 1
+        except FileNotFoundError:
+            pass
+
+    def _fingerprint(self, file_path):
+        """返回 (size, mtime_ns, 内容哈希)"""
+        st = os.stat(file_path)
+        record = self.records.get(self._key(file_path))
+        if record and record.get('size') == st.st_size and record.get('mtime_ns') == st.st_mtime_ns:
+            return st.st_size, st.st_mtime_ns, record['hash']
+        return st.st_size, st.st_mtime_ns, file_digest(file_path)
+
+    def is_current(self, file_path, output_path):
+        """输入内容、调色板和设置都未变化、上次成功且输出文件仍存在时返回True"""
+        key = self._key(file_path)
+        try:
+            fingerprint = self._fingerprint(file_path)
+        except OSError:
+            return False
+        self._pending[key] = fingerprint
+        record = self.records.get(key)
+        return bool(record and record.get('status') == 'ok' and
+                    record['hash'] == fingerprint[2] and
+                    record.get('palette') == self.palette and
+                    record.get('settings') == self.settings and
+                    record.get('output') == os.path.abspath(output_path) and
+                    os.path.exists(output_path))
+
+    def filter_pending(self, files, output_path_for):
+        """逐个产出需要处理的文件（files 可以是生成器），output_path_for(file_path) 给出输出路径
+
+        跳过的文件数累计在 skipped 中。
+        """
+        for file_path in files:
+            if self.is_current(file_path, output_path_for(file_path)):
+                self.skipped += 1
+            else:
+                yield file_path
+
+    def record(self, file_path, output_path, error=None):
+        """记录一个文件的处理结果并立即写入磁盘"""
+        key = self._key(file_path)
+        fingerprint = self._pending.pop(key, None)
+        if fingerprint is None:
+            try:
+                fingerprint = self._fingerprint(file_path)
+            except OSError:
+                fingerprint = (None, None, None)
+        size, mtime_ns, digest = fingerprint
+        record = {
+            'input': key,
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'hash': digest,
+            'palette': self.palette,
+            'settings': self.settings,
+            'output': os.path.abspath(output_path),
+            'status': 'ok' if error is None else 'failed',
+        }
+        if error is not None:
+            record['error'] = error
+        self.records[key] = record
+
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._lines += 1
+
+    def close(self):
+        """关闭清单；重复记录过多时压缩为每个文件一行"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._lines > 2 * len(self.records) + 100:
+            self._compact()
+
+    def _compact(self):
+        folder = os.path.dirname(self.path) or '.'
+        try:
+            # 先写临时文件再替换，避免压缩时崩溃导致清单丢失
+            fd, tmp_path = tempfile.mkstemp(suffix='.jsonl', dir=folder)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                for record in self.records.values():
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.path)
+            self._lines = len(self.records)
+        except OSError:
+            pass
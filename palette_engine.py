@@ -0,0 +1,482 @@
+"""调色板映射引擎（只依赖NumPy和Pillow，不导入Qt；安装了Numba时额外提供 numba 引擎）"""
+import hashlib
+import importlib.util
+import os
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+# 只检查 numba 是否已安装，创建 numba 引擎时才导入（见 palette_numba）
+HAS_NUMBA = importlib.util.find_spec("numba") is not None
+
+from color_metrics import (METRICS, SEPARABLE_METRICS, distance_matrix, separable_features,
+                           separable_weights, to_space)
+from palette_index import TREE_METRICS, TreeEngine
+
+# 预设颜色
+PRESET_COLORS = [
+    "#FF0000", "#00FF00", "#0000FF",  # 三原色
+    "#FFFF00", "#FF00FF", "#00FFFF",  # 二次色
+    "#000000", "#FFFFFF", "#808080",  # 黑白灰
+    "#FFA500", "#800080", "#008000"  # 橙紫绿
+]
+
+# 调色板颜色数达到该值时改用KD树（由 benchmark.py palette-index 测得的交叉点）
+TREE_MIN_PALETTE = 1536
+
+# auto 引擎在一次映射的像素数达到该值时改用查找表
+AUTO_TABLE_MIN_PIXELS = 1 << 14
+
+# 查找表默认缓存目录
+LUT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "color_simplifier", "lut")
+
+
+def parse_hex_colors(color_hex_list):
+    """将16进制颜色代码列表解析为 (N, 3) 的uint8数组"""
+    palette = []
+    for hex_color in color_hex_list:
+        hex_color = hex_color.strip().lstrip('#')
+        if len(hex_color) == 3:
+            hex_color = ''.join([c * 2 for c in hex_color])
+        rgb = tuple(int(hex_color[i:i + 2], 16) for i in (0, 2, 4))
+        palette.append(rgb)
+    return np.array(palette, dtype=np.uint8).reshape(-1, 3)
+
+
+def palette_hash(palette):
+    """计算调色板的哈希值（颜色顺序会影响平局时的结果，因此参与哈希）"""
+    palette = np.ascontiguousarray(palette, dtype=np.uint8).reshape(-1, 3)
+    return hashlib.sha1(palette.tobytes()).hexdigest()[:16]
+
+
+def index_dtype(palette_size):
+    """根据调色板大小选择最小的索引类型"""
+    return np.uint8 if palette_size <= 256 else np.uint16
+
+
+def pack_rgb(pixels):
+    """将 (N, 3) 像素打包为 0xRRGGBB 形式的uint32"""
+    pixels = pixels.reshape(-1, 3)
+    return ((pixels[:, 0].astype(np.uint32) << 16) | (pixels[:, 1].astype(np.uint32) << 8) |
+            pixels[:, 2])
+
+
+def unpack_rgb(keys):
+    """pack_rgb 的逆运算"""
+    keys = np.asarray(keys, dtype=np.uint32)
+    return np.stack([keys >> 16, (keys >> 8) & 0xff, keys & 0xff], axis=1).astype(np.uint8)
+
+
+def unique_colors(pixels):
+    """返回图像中的 (唯一颜色, 每个像素在唯一颜色中的下标, 每种颜色的像素数)"""
+    keys = pack_rgb(pixels)
+    unique_keys, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    return unpack_rgb(unique_keys), inverse, counts
+
+
+class NumpyEngine:
+    """整块数组的最近颜色映射（分块计算距离 + argmin）
+
+    rgb、redmean 和 lab76 的距离展开为 像素特征 @ 调色板系数 + 偏置，用矩阵乘法计算
+    （省略只与像素有关的项）。rgb 下所有中间值都是小于 2^24 的整数，float32 下精确无误差，
+    距离相等时 argmin 取调色板中靠前的颜色，与逐像素循环的结果一致。
+    de2000 对每个分块计算完整的距离矩阵。调色板只在创建引擎时转换一次。
+    """
+    name = "numpy"
+
+    # 不可展开的距离算法每个分块的 像素数 x 调色板大小 上限（控制临时数组大小）
+    PAIRWISE_BLOCK = 1 << 18
+
+    def __init__(self, palette, chunk_pixels=1 << 16, metric="rgb"):
+        self.palette = np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+        if len(self.palette) == 0:
+            raise ValueError("调色板为空")
+        if metric not in METRICS:
+            raise ValueError(f"未知的距离算法: {metric}")
+        self.chunk_pixels = chunk_pixels
+        self.metric = metric
+        if metric in SEPARABLE_METRICS:
+            self._weights, self._bias = separable_weights(metric, self.palette)
+        else:
+            self._colors = to_space(metric, self.palette)
+
+    def _block_distances(self, block_pixels):
+        if self.metric in SEPARABLE_METRICS:
+            features = separable_features(self.metric, block_pixels)
+            return features @ self._weights + self._bias
+        return distance_matrix(self.metric, to_space(self.metric, block_pixels), self._colors)
+
+    def map_indices(self, pixels):
+        """将 (N, 3) 像素映射为调色板索引"""
+        pixels = pixels.reshape(-1, 3)
+        total = len(pixels)
+        indices = np.empty(total, dtype=index_dtype(len(self.palette)))
+        chunk = self.chunk_pixels
+        if self.metric not in SEPARABLE_METRICS:
+            chunk = min(chunk, max(1, self.PAIRWISE_BLOCK // len(self.palette)))
+
+        for start in range(0, total, chunk):
+            block_dist = self._block_distances(pixels[start:start + chunk])
+            indices[start:start + chunk] = block_dist.argmin(axis=1)
+
+        return indices
+
+    def quantize(self, img_array):
+        """将 (H, W, 3) 图像映射为只含调色板颜色的图像"""
+        indices = self.map_indices(img_array)
+        return self.palette[indices].reshape(img_array.shape)
+
+
+def choose_engine(palette_size, metric="rgb"):
+    """按调色板大小选择逐像素精确计算的引擎：小调色板暴力搜索，大调色板KD树"""
+    if metric in TREE_METRICS and palette_size >= TREE_MIN_PALETTE:
+        return TreeEngine.name
+    return NumpyEngine.name
+
+
+def _exact_engine(palette, metric):
+    palette = np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+    return ENGINES[choose_engine(len(palette), metric)](palette, metric=metric)
+
+
+def _axis_samples(bits):
+    """每个查找表单元在单个通道上覆盖的最小值和最大值"""
+    step = 1 << (8 - bits)
+    low = np.arange(0, 256, step, dtype=np.uint8)
+    return low, low + np.uint8(step - 1)
+
+
+def _grid_indices(engine, values):
+    """计算三个通道取值笛卡尔积上的调色板索引，形状为 (n, n, n)"""
+    r, g, b = np.meshgrid(values, values, values, indexing='ij')
+    points = np.stack([r, g, b], axis=-1)
+    return engine.map_indices(points).reshape(r.shape)
+
+
+def build_lut(palette, bits=5, metric="rgb"):
+    """构建 RGB -> 调色板索引的三维查找表
+
+    返回 (table, exact)：table 为每个单元中心的最近颜色索引；
+    exact 标记单元的8个角点是否映射到同一颜色。
+    RGB欧氏距离下最近颜色区域是凸的，角点一致时整个单元都映射到该颜色，
+    因此只有 exact 为False的边界单元需要逐像素复查。其他距离算法没有这个性质。
+    """
+    engine = _exact_engine(palette, metric)
+    if bits == 8:
+        table = _grid_indices(engine, np.arange(256, dtype=np.uint8))
+        return table, np.ones(table.shape, dtype=bool)
+
+    low, high = _axis_samples(bits)
+    step = 1 << (8 - bits)
+    center = low + np.uint8(step // 2)
+    table = _grid_indices(engine, center)
+
+    # 角点网格：每个通道交替取单元的最小值和最大值
+    corners = _grid_indices(engine, np.stack([low, high], axis=1).ravel())
+    n = len(low)
+    corners = corners.reshape(n, 2, n, 2, n, 2).transpose(0, 2, 4, 1, 3, 5).reshape(n, n, n, 8)
+    exact = (corners == corners[..., :1]).all(axis=-1)
+    return table, exact
+
+
+def table_bits(metric, bits=5, exact=True):
+    """查找表引擎实际使用的表精度：粗表的边界判断只对 rgb 成立，其他距离算法精确映射时需要完整的表"""
+    return 8 if exact and metric != 'rgb' else bits
+
+
+def lut_path(palette, bits=5, cache_dir=None, metric="rgb"):
+    """查找表在磁盘缓存中的路径"""
+    return os.path.join(cache_dir or LUT_CACHE_DIR, f"lut_{palette_hash(palette)}_{metric}_{bits}.npz")
+
+
+def load_lut(palette, bits=5, cache_dir=None, metric="rgb"):
+    """从磁盘缓存读取查找表，不存在时构建并写入缓存"""
+    cache_dir = cache_dir or LUT_CACHE_DIR
+    path = lut_path(palette, bits, cache_dir, metric)
+
+    if os.path.exists(path):
+        try:
+            with np.load(path) as data:
+                return data['table'], data['exact']
+        except (OSError, ValueError, KeyError):
+            pass  # 缓存损坏时重新构建
+
+    table, exact = build_lut(palette, bits, metric)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # 先写临时文件再替换，避免多个进程同时写入时读到半个文件
+        fd, tmp_path = tempfile.mkstemp(suffix='.npz', dir=cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, table=table, exact=exact)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass  # 缓存目录不可写时只在内存中使用
+    return table, exact
+
+
+class LutEngine:
+    """基于三维查找表的映射：每张图只需一次索引取值
+
+    bits=8 时为完整的 256^3 表；更小的 bits 为粗表，
+    exact=True 时只对边界单元中的像素重新计算距离，结果与逐像素计算一致。
+    粗表的边界判断只对 rgb 成立，其他距离算法在 exact=True 时总是使用完整的表
+    （首次构建较慢，之后从磁盘缓存读取）。
+    """
+    name = "lut"
+
+    # 同一进程内复用已加载的查找表
+    _memo = {}
+
+    def __init__(self, palette, bits=5, exact=True, cache_dir=None, metric="rgb"):
+        self.palette = np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+        if len(self.palette) == 0:
+            raise ValueError("调色板为空")
+        if not 1 <= bits <= 8:
+            raise ValueError("查找表位数必须在1到8之间")
+        bits = table_bits(metric, bits, exact)
+        self.bits = bits
+        self.exact = exact
+        self.metric = metric
+
+        key = (palette_hash(self.palette), metric, bits)
+        if key not in self._memo:
+            self._memo[key] = load_lut(self.palette, bits, cache_dir, metric)
+        table, exact_cells = self._memo[key]
+        self._table = table.astype(index_dtype(len(self.palette)), copy=False).ravel()
+        self._exact_cells = exact_cells.ravel()
+        self._fallback = UniqueColorEngine(_exact_engine(self.palette, metric))
+
+    def _cell_keys(self, pixels):
+        shift = 8 - self.bits
+        channels = pixels.astype(np.uint32)
+        if shift:
+            channels >>= shift
+        return (channels[:, 0] << (2 * self.bits)) | (channels[:, 1] << self.bits) | channels[:, 2]
+
+    def map_indices(self, pixels):
+        """将 (N, 3) 像素映射为调色板索引"""
+        pixels = pixels.reshape(-1, 3)
+        keys = self._cell_keys(pixels)
+        indices = self._table[keys]
+        if self.exact and self.bits < 8:
+            self._fix_boundary(pixels, keys, indices)
+        return indices
+
+    def _fix_boundary(self, pixels, keys, indices):
+        """逐像素重新计算落在边界单元中的像素"""
+        boundary = np.flatnonzero(~self._exact_cells[keys])
+        if len(boundary):
+            indices[boundary] = self._fallback.map_indices(pixels[boundary])
+
+    def quantize(self, img_array):
+        """将 (H, W, 3) 图像映射为只含调色板颜色的图像"""
+        indices = self.map_indices(img_array)
+        return self.palette[indices].reshape(img_array.shape)
+
+
+class PillowEngine(LutEngine):
+    """由Pillow的C代码完成映射（Image.quantize(palette=...)），只支持 rgb 距离和不超过256种颜色
+
+    Pillow按 64x64x32 的缓存单元取近似的最近颜色，不是逐像素精确计算。
+    exact=True 时借用查找表引擎的边界标记：非边界单元中只有一个最近颜色，Pillow的结果必然正确；
+    落在边界单元中的像素逐像素重新计算，结果与 numpy 引擎一致。
+    """
+    name = "pillow"
+
+    # 每次交给Pillow的像素数（作为一行图像传入）
+    CHUNK_PIXELS = 1 << 20
+
+    def __init__(self, palette, bits=5, exact=True, cache_dir=None, metric="rgb"):
+        palette = np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+        if metric != "rgb":
+            raise ValueError(f"Pillow引擎不支持距离算法: {metric}")
+        if len(palette) > 256:
+            raise ValueError("Pillow引擎的调色板最多256种颜色")
+        super().__init__(palette, bits, exact, cache_dir, metric)
+        self._palette_image = Image.new('P', (1, 1))
+        self._palette_image.putpalette(self.palette.tobytes())
+
+    def map_indices(self, pixels):
+        """将 (N, 3) 像素映射为调色板索引"""
+        pixels = pixels.reshape(-1, 3)
+        total = len(pixels)
+        indices = np.empty(total, dtype=np.uint8)
+        for start in range(0, total, self.CHUNK_PIXELS):
+            block = np.ascontiguousarray(pixels[start:start + self.CHUNK_PIXELS])
+            image = Image.fromarray(block.reshape(1, -1, 3), 'RGB')
+            indices[start:start + len(block)] = np.asarray(
+                image.quantize(palette=self._palette_image, dither=Image.Dither.NONE)).ravel()
+        if self.exact and self.bits < 8:
+            self._fix_boundary(pixels, self._cell_keys(pixels), indices)
+        return indices
+
+
+class NumbaEngine:
+    """Numba编译的逐像素暴力搜索（多线程），只支持 rgb 距离，需要安装 numba"""
+    name = "numba"
+
+    def __init__(self, palette, metric="rgb"):
+        if not HAS_NUMBA:
+            raise ValueError("numba 引擎需要安装 numba")
+        self.palette = np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+        if len(self.palette) == 0:
+            raise ValueError("调色板为空")
+        if metric != "rgb":
+            raise ValueError(f"numba 引擎不支持距离算法: {metric}")
+        self.metric = metric
+        self._palette = self.palette.astype(np.int32)
+        from palette_numba import nearest_rgb
+        self._kernel = nearest_rgb
+
+    def map_indices(self, pixels):
+        """将 (N, 3) 像素映射为调色板索引"""
+        pixels = np.ascontiguousarray(pixels.reshape(-1, 3))
+        indices = np.empty(len(pixels), dtype=index_dtype(len(self.palette)))
+        self._kernel(pixels, self._palette, indices)
+        return indices
+
+    def quantize(self, img_array):
+        """将 (H, W, 3) 图像映射为只含调色板颜色的图像"""
+        indices = self.map_indices(img_array)
+        return self.palette[indices].reshape(img_array.shape)
+
+
+class UniqueColorEngine:
+    """先把像素合并为唯一颜色，只映射唯一颜色，再按颜色值散射回每个像素
+
+    截图、图标等平面图形的颜色种类远少于像素数，可以省去绝大部分距离计算。
+    颜色种类太多（如带噪点的照片）时收益不足以抵消合并的开销，自动改为直接映射。
+    """
+
+    # 像素数少于该值时直接映射
+    MIN_PIXELS = 1 << 14
+    # 抽样估计的唯一颜色比例超过该值时认为图像噪声太大，直接映射
+    SAMPLE_SIZE = 1 << 16
+    MAX_SAMPLE_RATIO = 0.9
+    # 实际唯一颜色比例超过该值时直接映射
+    MAX_UNIQUE_RATIO = 0.25
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.name = engine.name
+        self.palette = engine.palette
+        # 2^24 种颜色的标记表和结果表，跨调用复用（用完只清除用到的位置）
+        self._present = None
+        self._lookup = None
+
+    def map_indices(self, pixels):
+        """将 (N, 3) 像素映射为调色板索引"""
+        pixels = pixels.reshape(-1, 3)
+        total = len(pixels)
+        if total < self.MIN_PIXELS:
+            return self.engine.map_indices(pixels)
+
+        sample = pack_rgb(pixels[::max(1, total // self.SAMPLE_SIZE)])
+        if len(np.unique(sample)) > self.MAX_SAMPLE_RATIO * len(sample):
+            return self.engine.map_indices(pixels)
+
+        if self._present is None:
+            self._present = np.zeros(1 << 24, dtype=bool)
+            self._lookup = np.zeros(1 << 24, dtype=index_dtype(len(self.palette)))
+
+        keys = pack_rgb(pixels)
+        self._present[keys] = True
+        unique_keys = np.flatnonzero(self._present)
+        self._present[unique_keys] = False
+
+        if len(unique_keys) > self.MAX_UNIQUE_RATIO * total:
+            return self.engine.map_indices(pixels)
+
+        self._lookup[unique_keys] = self.engine.map_indices(unpack_rgb(unique_keys))
+        return self._lookup[keys]
+
+    def quantize(self, img_array):
+        """将 (H, W, 3) 图像映射为只含调色板颜色的图像"""
+        indices = self.map_indices(img_array)
+        return self.palette[indices].reshape(img_array.shape)
+
+
+# 可用的映射引擎
+ENGINES = {
+    NumpyEngine.name: NumpyEngine,
+    LutEngine.name: LutEngine,
+    TreeEngine.name: TreeEngine,
+    PillowEngine.name: PillowEngine,
+}
+if HAS_NUMBA:
+    ENGINES[NumbaEngine.name] = NumbaEngine
+
+
+def auto_engine(pixel_count, palette_size, metric="rgb", table_cached=False):
+    """按一次映射的像素数和调色板大小选择引擎（由 benchmark.py engines 测得）
+
+    小图像（以及误差扩散每次映射的少量像素）直接逐像素计算，省去加载查找表；
+    rgb 下的大图像用查找表，不超过256色时由Pillow完成查表。
+    其他距离算法的精确查找表需要完整的 256^3 表，首次构建太慢，只在磁盘缓存中已有时使用。
+    """
+    if metric != "rgb" and table_cached and pixel_count >= AUTO_TABLE_MIN_PIXELS:
+        return LutEngine.name
+    if metric != "rgb" or pixel_count < AUTO_TABLE_MIN_PIXELS:
+        name = choose_engine(palette_size, metric)
+        if name == NumpyEngine.name and metric == "rgb" and NumbaEngine.name in ENGINES:
+            return NumbaEngine.name
+        return name
+    if palette_size <= 256:
+        return PillowEngine.name
+    return LutEngine.name
+
+
+class AutoEngine:
+    """每次映射时按像素数选择引擎，各引擎在首次用到时创建，结果与任一精确引擎一致"""
+    name = "auto"
+
+    def __init__(self, palette, metric="rgb"):
+        self.palette = np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+        if len(self.palette) == 0:
+            raise ValueError("调色板为空")
+        self.metric = metric
+        self._engines = {}
+        self._table_cached = metric != "rgb" and os.path.exists(lut_path(self.palette, table_bits(metric),
+                                                                          metric=metric))
+
+    def engine_for(self, pixel_count):
+        name = auto_engine(pixel_count, len(self.palette), self.metric, self._table_cached)
+        if name not in self._engines:
+            self._engines[name] = create_engine(self.palette, name, metric=self.metric)
+        return self._engines[name]
+
+    def map_indices(self, pixels):
+        """将 (N, 3) 像素映射为调色板索引"""
+        pixels = pixels.reshape(-1, 3)
+        return self.engine_for(len(pixels)).map_indices(pixels)
+
+    def quantize(self, img_array):
+        """将 (H, W, 3) 图像映射为只含调色板颜色的图像"""
+        indices = self.map_indices(img_array)
+        return self.palette[indices].reshape(img_array.shape)
+
+
+def check_engine(engine, palette_size, metric="rgb"):
+    """检查引擎与距离算法、调色板大小的组合，不支持时抛出 ValueError（在创建进程池等开销较大的操作之前调用）"""
+    if engine != AutoEngine.name and engine not in ENGINES:
+        raise ValueError(f"未知的映射引擎: {engine}")
+    if engine in (PillowEngine.name, NumbaEngine.name) and metric != "rgb":
+        raise ValueError(f"{engine} 引擎只支持 rgb 距离")
+    if engine == PillowEngine.name and palette_size > 256:
+        raise ValueError("pillow 引擎的调色板最多256种颜色")
+
+
+def create_engine(palette, engine="numpy", dedup=True, **options):
+    """按名称创建映射引擎，engine="auto" 时按每次映射的像素数和调色板大小自动选择
+
+    dedup=True 时计算型引擎先合并唯一颜色（查找表引擎本身就是按颜色查表，不需要）。
+    """
+    if engine == AutoEngine.name:
+        return AutoEngine(palette, **options)
+    if engine not in ENGINES:
+        raise ValueError(f"未知的映射引擎: {engine}")
+    instance = ENGINES[engine](palette, **options)
+    if dedup and engine not in (LutEngine.name, PillowEngine.name):
+        instance = UniqueColorEngine(instance)
+    return instance
@@ -0,0 +1,163 @@
+"""调色板空间索引：大调色板（数百到数千种颜色）的批量最近邻查询"""
+import numpy as np
+
+from color_metrics import to_space
+
+# 叶子节点最多包含的颜色数
+LEAF_SIZE = 8
+
+# KD树支持的距离算法（在某个颜色空间中为欧氏距离）
+TREE_METRICS = ('rgb', 'lab76')
+
+
+class PaletteKDTree:
+    """调色板颜色上的KD树，所有查询点逐层同步遍历（每层一次向量化运算）
+
+    查询结果精确：距离相等时返回调色板中靠前的颜色，与暴力搜索一致。
+    """
+
+    def __init__(self, points, leaf_size=LEAF_SIZE):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        self.leaf_size = leaf_size
+
+        lo, hi, left, right, split_dim, split_val, members = [], [], [], [], [], [], []
+
+        def build(idx):
+            node = len(lo)
+            pts = self.points[idx]
+            lo.append(pts.min(axis=0))
+            hi.append(pts.max(axis=0))
+            left.append(-1)
+            right.append(-1)
+            split_dim.append(0)
+            split_val.append(0.0)
+            members.append(None)
+
+            if len(idx) <= leaf_size:
+                members[node] = np.sort(idx)
+                return node
+
+            # 沿跨度最大的维度按中位数切分
+            dim = int(np.argmax(hi[node] - lo[node]))
+            order = idx[np.argsort(pts[:, dim], kind='stable')]
+            mid = len(order) // 2
+            split_dim[node] = dim
+            split_val[node] = self.points[order[mid], dim]
+            left[node] = build(order[:mid])
+            right[node] = build(order[mid:])
+            return node
+
+        build(np.arange(len(self.points)))
+
+        self._lo = np.array(lo)
+        self._hi = np.array(hi)
+        self._left = np.array(left)
+        self._right = np.array(right)
+        self._split_dim = np.array(split_dim)
+        self._split_val = np.array(split_val)
+
+        # 叶子成员填充为定长数组，-1 表示空位
+        self._members = np.full((len(lo), leaf_size), -1, dtype=np.int64)
+        for node, idx in enumerate(members):
+            if idx is not None:
+                self._members[node, :len(idx)] = idx
+        self.depth = self._depth(0)
+
+    def _depth(self, node):
+        if self._left[node] < 0:
+            return 1
+        return 1 + max(self._depth(self._left[node]), self._depth(self._right[node]))
+
+    def _leaf_nearest(self, queries, nodes):
+        """对 (查询点, 叶子) 对求叶子内的最近颜色"""
+        members = self._members[nodes]
+        valid = members >= 0
+        diff = queries[:, None, :] - self.points[np.where(valid, members, 0)]
+        dist = np.einsum('nkc,nkc->nk', diff, diff)
+        dist[~valid] = np.inf
+        # 成员按调色板顺序排列，argmin 在相等时取靠前的颜色
+        best = dist.argmin(axis=1)
+        rows = np.arange(len(nodes))
+        return dist[rows, best], members[rows, best]
+
+    def query(self, queries):
+        """返回每个查询点最近颜色的 (平方距离, 索引)"""
+        queries = np.asarray(queries, dtype=np.float64).reshape(-1, 3)
+        n = len(queries)
+
+        # 第一步：每个点直接下降到所在叶子，得到初始上界
+        node = np.zeros(n, dtype=np.int64)
+        for _ in range(self.depth - 1):
+            internal = self._left[node] >= 0
+            dims = self._split_dim[node]
+            go_right = queries[np.arange(n), dims] >= self._split_val[node]
+            child = np.where(go_right, self._right[node], self._left[node])
+            node = np.where(internal, child, node)
+        best_dist, best_idx = self._leaf_nearest(queries, node)
+
+        # 第二步：从根节点逐层展开，只保留包围盒距离不超过当前上界的节点
+        frontier_q = np.arange(n)
+        frontier_node = np.zeros(n, dtype=np.int64)
+        while len(frontier_q):
+            q_points = queries[frontier_q]
+            gap = np.maximum(self._lo[frontier_node] - q_points, 0)
+            gap += np.maximum(q_points - self._hi[frontier_node], 0)
+            box_dist = np.einsum('nc,nc->n', gap, gap)
+            keep = box_dist <= best_dist[frontier_q]
+            frontier_q = frontier_q[keep]
+            frontier_node = frontier_node[keep]
+
+            is_leaf = self._left[frontier_node] < 0
+            if is_leaf.any():
+                leaf_q = frontier_q[is_leaf]
+                dist, idx = self._leaf_nearest(queries[leaf_q], frontier_node[is_leaf])
+                # 同一查询点可能有多个叶子，按 (点, 距离, 索引) 排序后取每个点的第一个
+                order = np.lexsort((idx, dist, leaf_q))
+                leaf_q, dist, idx = leaf_q[order], dist[order], idx[order]
+                first = np.ones(len(leaf_q), dtype=bool)
+                first[1:] = leaf_q[1:] != leaf_q[:-1]
+                leaf_q, dist, idx = leaf_q[first], dist[first], idx[first]
+                better = (dist < best_dist[leaf_q]) | ((dist == best_dist[leaf_q]) & (idx < best_idx[leaf_q]))
+                best_dist[leaf_q[better]] = dist[better]
+                best_idx[leaf_q[better]] = idx[better]
+
+            inner_q = frontier_q[~is_leaf]
+            inner_node = frontier_node[~is_leaf]
+            frontier_q = np.concatenate([inner_q, inner_q])
+            frontier_node = np.concatenate([self._left[inner_node], self._right[inner_node]])
+
+        return best_dist, best_idx
+
+
+class TreeEngine:
+    """基于KD树的映射引擎，适合大调色板
+
+    只支持在某个颜色空间中为欧氏距离的算法（rgb、lab76）。
+    """
+    name = "kdtree"
+
+    def __init__(self, palette, chunk_pixels=1 << 16, metric="rgb", leaf_size=LEAF_SIZE):
+        self.palette = np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+        if len(self.palette) == 0:
+            raise ValueError("调色板为空")
+        if metric not in TREE_METRICS:
+            raise ValueError(f"KD树不支持距离算法: {metric}")
+        self.chunk_pixels = chunk_pixels
+        self.metric = metric
+        self.tree = PaletteKDTree(to_space(metric, self.palette), leaf_size)
+
+    def map_indices(self, pixels):
+        """将 (N, 3) 像素映射为调色板索引"""
+        pixels = pixels.reshape(-1, 3)
+        total = len(pixels)
+        indices = np.empty(total, dtype=np.uint8 if len(self.palette) <= 256 else np.uint16)
+        for start in range(0, total, self.chunk_pixels):
+            block = to_space(self.metric, pixels[start:start + self.chunk_pixels])
+            _, indices[start:start + self.chunk_pixels] = self.tree.query(block)
+        return indices
+
+    def quantize(self, img_array):
+        """将 (H, W, 3) 图像映射为只含调色板颜色的图像"""
+        indices = self.map_indices(img_array)
+        return self.palette[indices].reshape(img_array.shape)
+
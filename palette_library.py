@@ -0,0 +1,152 @@
+"""调色板库：按名称保存调色板（JSON），保存时预先构建映射用的查找表，调色板修改或删除后清除旧的查找表"""
+import glob
+import json
+import os
+import tempfile
+
+from palette_engine import LUT_CACHE_DIR, PRESET_COLORS, load_lut, palette_hash, parse_hex_colors, table_bits
+
+# 调色板库文件
+LIBRARY_PATH = os.path.join(os.path.expanduser("~"), ".config", "color_simplifier", "palettes.json")
+
+# 内置调色板（不写入库文件，不能修改或删除）
+BUILTIN_PALETTES = {
+    "预设颜色": PRESET_COLORS,
+}
+
+
+def normalize_hex(color):
+    """将 #RGB / RRGGBB 等写法统一为 #RRGGBB，无效时抛出 ValueError"""
+    value = color.strip().lstrip('#')
+    if len(value) == 3:
+        value = ''.join(c * 2 for c in value)
+    if len(value) != 6:
+        raise ValueError(f"'{color}' 不是有效的16进制颜色代码")
+    int(value, 16)
+    return '#' + value.upper()
+
+
+class PaletteLibrary:
+    """已保存的调色板：名称 -> {'colors': [#RRGGBB, ...], 'hash': 内容哈希, 'metrics': [已准备的距离算法]}
+
+    查找表按调色板内容哈希缓存在 cache_dir（与 palette_engine.load_lut 相同），选择已准备的调色板时
+    映射引擎直接从缓存读取，不需要重新构建。库文件被手动编辑过时按新的哈希处理，旧的查找表随之清除。
+    """
+
+    def __init__(self, path=None, cache_dir=None):
+        self.path = path or LIBRARY_PATH
+        self.cache_dir = cache_dir or LUT_CACHE_DIR
+        self._palettes = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            return  # 库文件损坏时视为空库，下次保存时覆盖
+
+        stale = []
+        for name, entry in data.get('palettes', {}).items():
+            try:
+                colors = [normalize_hex(c) for c in entry['colors']]
+            except (KeyError, TypeError, ValueError):
+                continue
+            digest = palette_hash(parse_hex_colors(colors))
+            metrics = entry.get('metrics', [])
+            if entry.get('hash') != digest:
+                # 颜色在库外被修改：旧哈希对应的查找表作废
+                stale.append(entry.get('hash'))
+                metrics = []
+            self._palettes[name] = {'colors': colors, 'hash': digest, 'metrics': metrics}
+        if stale:
+            self._write()
+            for digest in stale:
+                self._discard(digest)
+
+    def _write(self):
+        folder = os.path.dirname(self.path) or '.'
+        os.makedirs(folder, exist_ok=True)
+        # 先写临时文件再替换，避免写入中途崩溃导致库文件损坏
+        fd, tmp_path = tempfile.mkstemp(suffix='.json', dir=folder)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'palettes': self._palettes}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def names(self):
+        """内置调色板在前，已保存的按名称排序"""
+        return list(BUILTIN_PALETTES) + sorted(n for n in self._palettes if n not in BUILTIN_PALETTES)
+
+    def colors(self, name):
+        """调色板的颜色列表（#RRGGBB）"""
+        if name in BUILTIN_PALETTES:
+            return [normalize_hex(c) for c in BUILTIN_PALETTES[name]]
+        if name not in self._palettes:
+            raise KeyError(f"调色板不存在: {name}")
+        return list(self._palettes[name]['colors'])
+
+    def palette(self, name):
+        """调色板的 (N, 3) uint8 数组"""
+        return parse_hex_colors(self.colors(name))
+
+    def save(self, name, colors, metrics=("rgb",)):
+        """保存（或覆盖）调色板并为 metrics 中的距离算法构建查找表；颜色有变化时清除旧的查找表
+
+        同名调色板之前已准备过的距离算法会一并重新准备。
+        """
+        name = name.strip()
+        if not name:
+            raise ValueError("调色板名称不能为空")
+        if name in BUILTIN_PALETTES:
+            raise ValueError(f"内置调色板不能修改: {name}")
+        colors = [normalize_hex(c) for c in colors]
+        if not colors:
+            raise ValueError("调色板为空")
+
+        digest = palette_hash(parse_hex_colors(colors))
+        old = self._palettes.get(name)
+        keep_metrics = old['metrics'] if old and old['hash'] == digest else []
+        self._palettes[name] = {'colors': colors, 'hash': digest, 'metrics': keep_metrics}
+        self._write()
+        if old and old['hash'] != digest:
+            self._discard(old['hash'])
+        # 修改后的调色板重新准备之前已准备过的距离算法
+        self.prepare(name, sorted(set(metrics) | set(old['metrics'] if old else [])))
+
+    def delete(self, name):
+        """删除调色板及其查找表"""
+        if name in BUILTIN_PALETTES:
+            raise ValueError(f"内置调色板不能删除: {name}")
+        entry = self._palettes.pop(name, None)
+        if entry is not None:
+            self._write()
+            self._discard(entry['hash'])
+
+    def prepare(self, name, metrics=("rgb",)):
+        """构建映射引擎所需的查找表（已缓存时直接跳过）
+
+        rgb 为5位粗表（lut、pillow 引擎共用），其他距离算法为完整的 256^3 表，首次构建较慢。
+        """
+        palette = self.palette(name)
+        for metric in metrics:
+            load_lut(palette, table_bits(metric), self.cache_dir, metric)
+        entry = self._palettes.get(name)
+        if entry is not None and not set(metrics) <= set(entry['metrics']):
+            entry['metrics'] = sorted(set(entry['metrics']) | set(metrics))
+            self._write()
+
+    def _discard(self, digest):
+        """删除某个哈希的所有查找表（仍被其他调色板使用时保留）"""
+        if not digest:
+            return
+        in_use = {entry['hash'] for entry in self._palettes.values()}
+        in_use.update(palette_hash(parse_hex_colors(c)) for c in BUILTIN_PALETTES.values())
+        if digest in in_use:
+            return
+        for path in glob.glob(os.path.join(self.cache_dir, f"lut_{digest}_*.npz")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
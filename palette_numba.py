@@ -0,0 +1,17 @@
+"""numba 引擎的编译内核（只在创建 NumbaEngine 时导入，导入 numba 需要数百毫秒，不拖慢其他引擎的启动）"""
+import numba
+import numpy as np
+
+
+@numba.njit(parallel=True, cache=True)
+def nearest_rgb(pixels, palette, out):
+    for i in numba.prange(pixels.shape[0]):
+        r, g, b = np.int32(pixels[i, 0]), np.int32(pixels[i, 1]), np.int32(pixels[i, 2])
+        best, best_dist = 0, np.int32(1 << 30)
+        for j in range(palette.shape[0]):
+            dr, dg, db = r - palette[j, 0], g - palette[j, 1], b - palette[j, 2]
+            dist = dr * dr + dg * dg + db * db
+            # 严格小于：距离相等时取调色板中靠前的颜色
+            if dist < best_dist:
+                best, best_dist = j, dist
+        out[i] = best
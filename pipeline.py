@@ -0,0 +1,164 @@
+"""多阶段流水线：各阶段由独立线程处理，阶段之间用有界队列连接
+
+磁盘读取、图像解码/编码与计算可以重叠进行；下游处理不过来时，
+上游在放入队列时阻塞（背压），队列中积压的图像数量有上限。
+"""
+import queue
+import threading
+import time
+
+# 检查停止标志的间隔（秒）
+POLL_INTERVAL = 0.05
+
+# 阶段线程结束的标记
+_DONE = object()
+
+
+class Cancelled(Exception):
+    """处理函数在检查到停止标志时抛出，中止正在处理的项"""
+
+    def __init__(self, message="已停止"):
+        super().__init__(message)
+
+
+class StageStats:
+    """单个阶段的计时：完成数量、处理耗时、等待上游和阻塞于下游的时间（均为各线程之和）"""
+
+    def __init__(self, name, threads):
+        self.name = name
+        self.threads = threads
+        self.count = 0
+        self.busy = 0.0
+        self.starved = 0.0  # 等待上游输入
+        self.blocked = 0.0  # 下游队列已满
+        self._lock = threading.Lock()
+
+    def add(self, busy=0.0, starved=0.0, blocked=0.0, count=0):
+        with self._lock:
+            self.count += count
+            self.busy += busy
+            self.starved += starved
+            self.blocked += blocked
+
+    def utilization(self, elapsed):
+        """该阶段线程的平均繁忙比例"""
+        if elapsed <= 0:
+            return 0.0
+        return self.busy / (elapsed * self.threads)
+
+    def summary(self, elapsed):
+        return (f"{self.name}: {self.count} 项, 处理 {self.busy:.2f}s, 等待输入 {self.starved:.2f}s, "
+                f"等待输出 {self.blocked:.2f}s, 利用率 {self.utilization(elapsed):.0%}")
+
+
+class PipelineStats:
+    """整条流水线的计时"""
+
+    def __init__(self):
+        self.stages = {}
+        self.start = None
+        self.end = None
+
+    @property
+    def elapsed(self):
+        if self.start is None:
+            return 0.0
+        return (self.end or time.perf_counter()) - self.start
+
+    def summary(self):
+        elapsed = self.elapsed
+        return "\n".join(stage.summary(elapsed) for stage in self.stages.values())
+
+
+def run_pipeline(items, stages, should_stop=None, queue_size=4, stats=None):
+    """按阶段处理 items，按完成顺序产出 (item, 错误信息或None)
+
+    stages 为 [(名称, 函数, 线程数)]，函数签名为 func(item, 上一阶段的结果)，
+    第一阶段收到的结果为None。某一阶段出错时该项跳过后续阶段。
+    should_stop 返回True时不再读取新的项，已在流水线中的项被丢弃。
+    items 迭代时抛出的异常视为输入结束：已在流水线中的项照常完成并产出，之后重新抛出该异常。
+    """
+    should_stop = should_stop or (lambda: False)
+    stats = stats if stats is not None else PipelineStats()
+    stats.start = time.perf_counter()
+    stopped = threading.Event()
+
+    # queues[i] 为第 i 阶段的输入，最后一个为结果队列（项数受上游队列限制，无需设上限）
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages] + [queue.Queue()]
+    item_lock = threading.Lock()
+    items = iter(items)
+    source_error = []  # items 迭代时抛出的异常
+
+    def next_item():
+        with item_lock:
+            if stopped.is_set() or source_error:
+                return _DONE
+            try:
+                return next(items, _DONE)
+            except Exception as e:
+                # 不能让第一阶段的线程异常退出，否则下游收不到 _DONE，结果队列永远等待
+                source_error.append(e)
+                return _DONE
+
+    def worker(index, func, stage_stats, remaining):
+        source, target = queues[index], queues[index + 1]
+        while True:
+            waited = time.perf_counter()
+            if index == 0:
+                entry = next_item()
+            else:
+                entry = source.get()
+            starved = time.perf_counter() - waited
+            if entry is _DONE:
+                break
+            if index == 0:
+                entry = (entry, None, None)
+
+            item, payload, error = entry
+            busy = 0.0
+            if error is None and not stopped.is_set():
+                start = time.perf_counter()
+                try:
+                    payload = func(item, payload)
+                except Exception as e:
+                    payload, error = None, str(e)
+                busy = time.perf_counter() - start
+
+            waited = time.perf_counter()
+            target.put((item, payload, error))
+            stage_stats.add(busy, starved, time.perf_counter() - waited, count=1)
+
+        # 本阶段最后一个退出的线程通知下一阶段的所有线程
+        with remaining[1]:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            next_threads = stages[index + 1][2] if index + 1 < len(stages) else 1
+            for _ in range(next_threads):
+                target.put(_DONE)
+
+    for index, (name, func, threads) in enumerate(stages):
+        stage_stats = StageStats(name, threads)
+        stats.stages[name] = stage_stats
+        remaining = [threads, threading.Lock()]
+        for _ in range(threads):
+            threading.Thread(target=worker, args=(index, func, stage_stats, remaining),
+                             name=f"pipeline-{name}", daemon=True).start()
+
+    results = queues[-1]
+    try:
+        while not should_stop():
+            try:
+                entry = results.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if entry is _DONE or should_stop():
+                break  # 停止后不再产出结果（包括因停止而中止的项）
+            item, _, error = entry
+            yield item, error
+        if source_error and not should_stop():
+            raise source_error[0]
+    finally:
+        # 停止时不等待正在处理的项，各阶段线程丢弃剩余的项后自行退出
+        stopped.set()
+        stats.end = time.perf_counter()
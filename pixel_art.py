@@ -0,0 +1,235 @@
+"""像素画生成（只依赖NumPy和Pillow，不导入Tk，可在子进程和命令行中使用）：每个像素块缩小为一种颜色，再铺满回原尺寸
+
+块的颜色按 reshape 后的分块视图整体归约，不逐块循环；宽高不能整除时，右边和下边剩余的像素单独成为较小的块。
+"""
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+from PIL import Image
+
+# 块颜色的计算方式：nearest 取块中心的像素（与原来的 NEAREST 缩小相同，容易产生锯齿），
+# mean 平均色，median 各通道的中位数，mode 块中出现最多的颜色
+PIXEL_MODES = ("mean", "median", "mode", "nearest")
+
+# median、mode 每次归约的像素数上限，限制排序用的临时数组大小
+BAND_PIXELS = 1 << 20
+
+# 在缩小的预览图像上近似计算时，每个块每个方向上的采样数
+PREVIEW_SAMPLES = 8
+
+
+def pixel_grid(size, pixel_size):
+    """按像素大小划分的格子数（列数, 行数），边缘不足一块的像素单独成块"""
+    width, height = size
+    return -(-width // pixel_size), -(-height // pixel_size)
+
+
+def _block_view(region, block_height, block_width):
+    """(行, 列, 通道) 数组的分块视图 (块行, 块高, 块列, 块宽, 通道)，不复制数据"""
+    s0, s1, s2 = region.strides
+    shape = (region.shape[0] // block_height, block_height, region.shape[1] // block_width, block_width,
+             region.shape[2])
+    return np.lib.stride_tricks.as_strided(region, shape, (block_height * s0, s0, block_width * s1, s1, s2),
+                                           writeable=False)
+
+
+def _pack(values):
+    """(..., 通道) 的uint8颜色打包为uint32，便于整体比较"""
+    keys = values[..., 0].astype(np.uint32)
+    for c in range(1, values.shape[-1]):
+        keys |= values[..., c].astype(np.uint32) << (8 * c)
+    return keys
+
+
+def _mode_colors(blocks):
+    """每个块中出现最多的颜色（次数相同时取打包值较小的颜色）"""
+    gh, bh, gw, bw, channels = blocks.shape
+    keys = _pack(blocks).transpose(0, 2, 1, 3).reshape(gh * gw, bh * bw)
+    keys.sort(axis=1)
+    n = keys.shape[1]
+    # 排序后相同颜色连续出现：run 为每个位置在本段连续相同颜色中的序号，最大处为出现最多的颜色
+    positions = np.arange(n, dtype=np.int32)
+    starts = np.empty(keys.shape, dtype=bool)
+    starts[:, 0] = True
+    np.not_equal(keys[:, 1:], keys[:, :-1], out=starts[:, 1:])
+    run = positions - np.maximum.accumulate(np.where(starts, positions, 0), axis=1)
+    best = keys[np.arange(len(keys)), run.argmax(axis=1)]
+    shifts = np.arange(channels, dtype=np.uint32) * 8
+    return ((best[:, None] >> shifts) & 0xFF).astype(np.uint8).reshape(gh, gw, channels)
+
+
+def _reduce_region(region, block_height, block_width, mode, out):
+    """region 的行列分别是块高、块宽的整数倍，每块的颜色写入 out (块行, 块列, 通道)"""
+    if mode == "nearest":
+        out[...] = region[block_height // 2::block_height, block_width // 2::block_width]
+        return
+    blocks = _block_view(region, block_height, block_width)
+    if mode == "mean":
+        # 先沿块高累加整行（连续内存），再沿块宽累加，比一次归约两个轴快数倍
+        total = blocks.sum(axis=1, dtype=np.uint32).sum(axis=2)
+        n = block_height * block_width
+        out[...] = (total + n // 2) // n
+        return
+    # median、mode 需要排序，按块行分批以限制临时数组大小
+    step = max(1, BAND_PIXELS // max(1, region.shape[1] * block_height))
+    for start in range(0, blocks.shape[0], step):
+        band = blocks[start:start + step]
+        if mode == "median":
+            out[start:start + step] = np.median(band, axis=(1, 3)).round()
+        else:
+            out[start:start + step] = _mode_colors(band)
+
+
+def reduce_blocks(array, pixel_size, mode="mean"):
+    """(H, W, 通道) 的uint8数组按 pixel_size 分块，返回每块的颜色 (块行, 块列, 通道)"""
+    if mode not in PIXEL_MODES:
+        raise ValueError(f"未知的像素化模式: {mode}")
+    height, width = array.shape[:2]
+    grid_width, grid_height = pixel_grid((width, height), pixel_size)
+    small = np.empty((grid_height, grid_width, array.shape[2]), dtype=np.uint8)
+    full_rows, full_cols = height // pixel_size, width // pixel_size
+    rest_height, rest_width = height - full_rows * pixel_size, width - full_cols * pixel_size
+    top, left = full_rows * pixel_size, full_cols * pixel_size
+    # 整块部分、右边、下边和右下角分别归约：(原图的行, 列, 块高, 块宽, small 的行, 列)
+    regions = ((slice(0, top), slice(0, left), pixel_size, pixel_size, slice(0, full_rows), slice(0, full_cols)),
+               (slice(0, top), slice(left, None), pixel_size, rest_width, slice(0, full_rows), slice(full_cols, None)),
+               (slice(top, None), slice(0, left), rest_height, pixel_size, slice(full_rows, None), slice(0, full_cols)),
+               (slice(top, None), slice(left, None), rest_height, rest_width, slice(full_rows, None),
+                slice(full_cols, None)))
+    for rows, cols, block_height, block_width, out_rows, out_cols in regions:
+        region = array[rows, cols]
+        if region.size:
+            _reduce_region(region, block_height, block_width, mode, small[out_rows, out_cols])
+    return small
+
+
+def expand_blocks(small, pixel_size, height, width):
+    """把每块的颜色铺满 pixel_size×pixel_size 的像素块（边缘的块截断到原尺寸），输出只写一遍"""
+    # 先按行重复：只有输出的 1/pixel_size 大小
+    rows = np.repeat(small, pixel_size, axis=0)[:height]
+    out = np.empty((height, width, small.shape[2]), dtype=np.uint8)
+    full_cols = width // pixel_size
+    # 整块部分把输出看作 (行, 块列, 块宽, 通道)，块颜色沿块宽广播写入
+    s0, s1, s2 = out.strides
+    blocks = np.lib.stride_tricks.as_strided(out, (height, full_cols, pixel_size, out.shape[2]),
+                                             (s0, pixel_size * s1, s1, s2))
+    blocks[...] = rows[:, :full_cols, None, :]
+    if full_cols * pixel_size < width:
+        out[:, full_cols * pixel_size:] = rows[:, full_cols:]
+    return out
+
+
+def _as_array(image):
+    """图像转为 (H, W, 通道) 的uint8数组和对应的Pillow模式（调色板图像按是否透明转为RGBA或RGB）"""
+    if image.mode not in ("L", "RGB", "RGBA"):
+        transparent = image.mode in ("LA", "PA", "RGBa", "La") or 'transparency' in image.info
+        image = image.convert("RGBA" if transparent else "RGB")
+    array = np.asarray(image)
+    if array.ndim == 2:
+        array = array[:, :, None]
+    return array, image.mode
+
+
+def _to_image(array, mode):
+    return Image.fromarray(array[:, :, 0] if mode == "L" else array, mode)
+
+
+def generate_pixel_art(image, pixel_size, mode="mean"):
+    """生成与原图同尺寸的像素画"""
+    array, image_mode = _as_array(image)
+    small = reduce_blocks(array, pixel_size, mode)
+    return _to_image(expand_blocks(small, pixel_size, *array.shape[:2]), image_mode)
+
+
+def pixel_colors(image, pixel_size, mode="mean"):
+    """只返回每块的颜色组成的小图（每块一个像素）"""
+    array, image_mode = _as_array(image)
+    return _to_image(reduce_blocks(array, pixel_size, mode), image_mode)
+
+
+def approximate_pixel_colors(proxy, grid, mode="mean", samples=PREVIEW_SAMPLES):
+    """在缩小的代理图像上近似计算 grid（列数, 行数）个块的颜色，用于交互预览
+
+    先把代理图像缩放到每块 samples×samples 个采样点（不超过代理图像本身的分辨率），再按块归约；
+    mean 用 BOX 缩放取面积平均，其他模式用最近邻采样，保留图像中实际存在的颜色。
+    """
+    samples = max(1, min(samples, proxy.width // grid[0], proxy.height // grid[1]))
+    resample = Image.Resampling.BOX if mode == "mean" else Image.Resampling.NEAREST
+    sampled = proxy.resize((grid[0] * samples, grid[1] * samples), resample)
+    return pixel_colors(sampled, samples, mode)
+
+
+def _save(image, path):
+    """保存像素画：自动创建子文件夹，JPEG等不支持透明的格式去掉透明通道"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if image.mode == "RGBA" and path.lower().endswith(('.jpg', '.jpeg', '.bmp')):
+        image = image.convert("RGB")
+    image.save(path)
+
+
+def pixelate_file(file_path, outputs, mode="mean"):
+    """图像只解码一次，按 outputs [(像素大小, 输出路径), ...] 依次生成并保存各尺寸的像素画"""
+    with Image.open(file_path) as img:
+        array, image_mode = _as_array(img)
+    height, width = array.shape[:2]
+    for pixel_size, output_path in outputs:
+        small = reduce_blocks(array, pixel_size, mode)
+        _save(_to_image(expand_blocks(small, pixel_size, height, width), image_mode), output_path)
+
+
+def _pixelate_in_worker(file_path, outputs, mode):
+    try:
+        pixelate_file(file_path, outputs, mode)
+    except Exception as e:
+        return str(e)
+    return None
+
+
+def pixelate_files(files, pixel_sizes, output_path_func, mode="mean", workers=1, should_stop=None):
+    """批量生成像素画，按完成顺序产出 (文件路径, 错误信息或None)
+
+    每个文件解码一次，所有像素大小都从同一份解码结果生成；output_path_func(文件路径, 像素大小) 给出输出路径；
+    workers > 1 时按文件分配到进程池并行处理；files 可以是生成器，边读取边提交（同时最多 2×workers 个任务）；
+    should_stop 返回True时不再提交新的文件。
+    """
+    should_stop = should_stop or (lambda: False)
+    workers = workers or os.cpu_count() or 1
+    if mode not in PIXEL_MODES:
+        raise ValueError(f"未知的像素化模式: {mode}")
+
+    def task(file_path):
+        return file_path, [(size, output_path_func(file_path, size)) for size in pixel_sizes], mode
+
+    if workers == 1:
+        for file_path in files:
+            if should_stop():
+                return
+            yield file_path, _pixelate_in_worker(*task(file_path))
+        return
+
+    # 使用spawn启动子进程，与 simplify_batch.process_files 一致
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    pending = {}
+    try:
+        files = iter(files)
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < 2 * workers and not should_stop():
+                file_path = next(files, None)
+                if file_path is None:
+                    exhausted = True
+                else:
+                    pending[executor.submit(_pixelate_in_worker, *task(file_path))] = file_path
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path = pending.pop(future)
+                try:
+                    yield file_path, future.result()
+                except Exception as e:  # 子进程异常退出等
+                    yield file_path, str(e)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,127 @@
+"""像素画批量转换命令行入口（不导入Tk，可在无显示环境中运行）
+
+用法示例:
+    python -m pixel_art_cli sprites "assets/*.png" -o out -s 4,8,16 --mode mode -j 8 -r
+"""
+import argparse
+import os
+import sys
+import time
+
+from pixel_art import PIXEL_MODES, pixelate_files
+from simplify_batch import output_path_for
+from simplify_cli import expand_inputs
+
+# 颜色简化支持的 .npy 数组不是Pillow能读取的图像格式，像素画转换时跳过
+SKIPPED_EXTENSIONS = ('.npy',)
+
+
+def parse_sizes(values):
+    """解析逗号分隔的像素大小列表（去重并保持顺序），无效时抛出 ValueError"""
+    sizes = []
+    for value in values:
+        for part in value.split(','):
+            if part.strip():
+                size = int(part)
+                if size < 1:
+                    raise ValueError(part)
+                if size not in sizes:
+                    sizes.append(size)
+    return sizes
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m pixel_art_cli",
+        description="将图片批量转换为像素画，每张图片只解码一次即可输出多种像素大小"
+    )
+    parser.add_argument("inputs", nargs="+", help="输入文件、文件夹或通配符（如 'assets/*.png'）")
+    parser.add_argument("-o", "--output", required=True, help="输出文件夹（不存在时自动创建）")
+    parser.add_argument("-s", "--sizes", action="append", default=[],
+                        help="像素大小，用逗号分隔，可重复指定（默认 16）；输出文件名为 pixel<大小>_<原文件名>")
+    parser.add_argument("--mode", choices=PIXEL_MODES, default="mean",
+                        help="块颜色：mean（平均色）、median（中位数）、mode（出现最多的颜色）、nearest（块中心的像素）"
+                             "（默认 mean）")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="并行进程数（默认为CPU核数）")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="递归处理子文件夹（输出时保留子文件夹结构），并允许通配符中使用 **")
+    parser.add_argument("--include", action="append", default=[],
+                        help="只处理与通配符匹配的文件（匹配相对路径或文件名），可重复指定")
+    parser.add_argument("--exclude", action="append", default=[],
+                        help="跳过与通配符匹配的文件和子文件夹，可重复指定")
+    parser.add_argument("-q", "--quiet", action="store_true", help="只输出错误信息")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    try:
+        sizes = parse_sizes(args.sizes or ["16"])
+    except ValueError:
+        print("错误: 像素大小必须是正整数", file=sys.stderr)
+        return 2
+    if args.workers < 1:
+        print("错误: 进程数必须大于0", file=sys.stderr)
+        return 2
+
+    os.makedirs(args.output, exist_ok=True)
+
+    # 边扫描边处理：记录每个文件所属的输入文件夹，用于在输出中保留子文件夹结构
+    roots = {}
+    found = [0]
+    collisions = [0]
+    claimed = {}  # 输出路径（以第一个像素大小为准）-> 输入文件
+
+    def discovered():
+        for file_path, root in expand_inputs(args.inputs, args.recursive, args.include, args.exclude,
+                                             skip_dirs=(args.output,)):
+            if file_path.lower().endswith(SKIPPED_EXTENSIONS):
+                continue
+            roots[file_path] = root
+            found[0] += 1
+            # 不同输入（如两个输入文件夹中的同名文件）的输出路径相同时跳过后来的文件，避免覆盖
+            target = os.path.abspath(output_path(file_path, sizes[0]))
+            other = claimed.setdefault(target, file_path)
+            if other != file_path:
+                collisions[0] += 1
+                print(f"错误: {file_path} 与 {other} 的输出文件相同（{target}），已跳过", file=sys.stderr)
+                continue
+            yield file_path
+
+    def output_path(file_path, size):
+        return output_path_for(file_path, args.output, roots.get(file_path), prefix=f"pixel{size}_")
+
+    start = time.perf_counter()
+    failed = 0
+    idx = 0
+    results = pixelate_files(discovered(), sizes, output_path, args.mode, args.workers)
+    try:
+        for idx, (file_path, error) in enumerate(results, 1):
+            # 总数为目前已发现的文件数，扫描结束前会继续增长
+            progress = f"[{idx}/{found[0]}]"
+            if error is None:
+                if not args.quiet:
+                    print(f"{progress} {file_path}")
+            else:
+                failed += 1
+                print(f"{progress} 处理 {file_path} 时出错: {error}", file=sys.stderr)
+    except KeyboardInterrupt:
+        results.close()
+        print("处理已停止", file=sys.stderr)
+        return 130
+
+    if not found[0]:
+        print("错误: 没有找到图片文件", file=sys.stderr)
+        return 1
+    succeeded = idx - failed
+    failed += collisions[0]
+    if not args.quiet:
+        print(f"完成: {succeeded} 成功, {failed} 失败, 每张输出 {len(sizes)} 种像素大小, "
+              f"用时 {time.perf_counter() - start:.2f} 秒")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
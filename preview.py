@@ -0,0 +1,192 @@
+"""颜色简化预览（不依赖Qt）：缩小的代理图像缓存在内存中，调色板变化时只重新映射代理图像的唯一颜色
+
+只增加或删除一种颜色时增量更新：增加颜色只需计算每种唯一颜色到新颜色的距离，
+删除颜色只需重新映射原来映射到该颜色的唯一颜色，耗时与调色板大小基本无关。
+"""
+import collections
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+from color_metrics import distance_matrix, to_space
+from dithering import dither_indices
+from palette_engine import (LutEngine, NumpyEngine, create_engine, index_dtype, lut_path, table_bits,
+                            unique_colors)
+from pipeline import Cancelled
+from tile_stream import without_pixel_limit
+
+# 代理图像最长边的像素数
+PREVIEW_SIZE = 512
+
+# 完整重新映射时每块的唯一颜色数（每块之后检查是否已有更新的请求）
+NEAREST_CHUNK = 1 << 14
+
+# 内存中缓存的代理图像数量
+PROXY_CACHE_SIZE = 4
+
+
+def load_proxy(path, size=PREVIEW_SIZE):
+    """读取缩小的RGB代理图像：JPEG按DCT缩放解码，其他格式解码后逐级缩小
+
+    超过Pillow像素数量限制的图像（如大幅扫描件）只要缩放解码后不超过限制即可预览，否则抛出 ValueError。
+    """
+    limit = Image.MAX_IMAGE_PIXELS
+    with without_pixel_limit():
+        img = Image.open(path)
+    with img:
+        img.draft('RGB', (size, size))
+        if limit and img.width * img.height > 2 * limit:
+            raise ValueError(f"图像过大（{img.width}x{img.height}），无法生成预览")
+        img.thumbnail((size, size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        return np.array(img)
+
+
+class PreviewRenderer:
+    """一张代理图像的预览，保存每种唯一颜色当前的最近颜色和距离，供下一次增量更新使用"""
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+        colors, inverse, _ = unique_colors(proxy)
+        self.colors = colors
+        self._inverse = inverse.reshape(proxy.shape[:2])
+        self._palette = None
+        self._metric = None
+        self._index = None  # 每种唯一颜色的调色板索引
+        self._dist = None  # 每种唯一颜色到所选颜色的距离
+
+    def _nearest(self, rows, palette, metric, should_stop=None):
+        """唯一颜色中 rows 对应颜色的 (调色板索引, 距离)
+
+        调色板的查找表已在磁盘缓存中（如调色板库中已准备的调色板）时查表，否则暴力搜索；
+        分块计算，每块之后检查 should_stop。
+        """
+        colors = self.colors[rows]
+        if os.path.exists(lut_path(palette, table_bits(metric), metric=metric)):
+            engine = LutEngine(palette, metric=metric)
+        else:
+            engine = NumpyEngine(palette, metric=metric)
+        index = np.empty(len(colors), dtype=index_dtype(len(palette)))
+        for start in range(0, len(colors), NEAREST_CHUNK):
+            if should_stop is not None and should_stop():
+                raise Cancelled()
+            index[start:start + NEAREST_CHUNK] = engine.map_indices(colors[start:start + NEAREST_CHUNK])
+        dist = np.empty(len(index), dtype=np.float32)
+        points = to_space(metric, colors)
+        space = to_space(metric, palette)
+        for k in np.unique(index):
+            members = index == k
+            dist[members] = distance_matrix(metric, points[members], space[k:k + 1])[:, 0]
+        return index, dist
+
+    def _update(self, palette, metric, should_stop=None):
+        old = self._palette
+        # 中途取消时状态不完整，下一次完整重新计算
+        self._palette = None
+        n = len(palette)
+        if old is not None and metric == self._metric and len(old) < n and np.array_equal(palette[:len(old)], old):
+            # 在末尾增加颜色：距离严格更小时才改选新颜色，与暴力搜索的平局规则一致
+            points = to_space(metric, self.colors)
+            for k in range(len(old), n):
+                dist = distance_matrix(metric, points, to_space(metric, palette[k:k + 1]))[:, 0]
+                better = dist < self._dist
+                self._index[better] = k
+                self._dist[better] = dist[better]
+        elif old is not None and metric == self._metric and len(old) == n + 1 and n > 0:
+            removed = next((k for k in range(n) if not np.array_equal(old[k], palette[k])), n)
+            if not np.array_equal(np.delete(old, removed, axis=0), palette):
+                self._index, self._dist = self._nearest(slice(None), palette, metric, should_stop)
+            else:
+                # 删除一种颜色：其后的索引前移，原来映射到它的唯一颜色重新映射
+                affected = np.flatnonzero(self._index == removed)
+                self._index[self._index > removed] -= 1
+                if len(affected):
+                    self._index[affected], self._dist[affected] = self._nearest(affected, palette, metric)
+        elif old is None or metric != self._metric or not np.array_equal(old, palette):
+            self._index, self._dist = self._nearest(slice(None), palette, metric, should_stop)
+        self._palette = palette.copy()
+        self._metric = metric
+
+    def render(self, palette, metric="rgb", dither="none", should_stop=None):
+        """返回 (H, W, 3) 的预览图像；抖动时整张代理图像重新映射，should_stop 返回True时抛出 Cancelled"""
+        palette = np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+        if dither not in (None, "none"):
+            def progress(_):
+                if should_stop is not None and should_stop():
+                    raise Cancelled()
+            indices = dither_indices(self.proxy, create_engine(palette, "numpy", metric=metric), dither, progress)
+            return palette[indices]
+        self._update(palette, metric, should_stop)
+        return palette[self._index[self._inverse]]
+
+
+class PreviewService:
+    """后台预览线程：只渲染最新的请求，新请求到达时中止仍在进行的过时渲染
+
+    callback(请求编号, 预览图像或None, 错误信息或None) 在后台线程中调用。
+    """
+
+    def __init__(self, callback, size=PREVIEW_SIZE):
+        self.callback = callback
+        self.size = size
+        self._renderers = collections.OrderedDict()  # (路径, 修改时间, 大小) -> PreviewRenderer
+        self._condition = threading.Condition()
+        self._request = None
+        self._generation = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="preview", daemon=True)
+        self._thread.start()
+
+    def request(self, path, palette, metric="rgb", dither="none"):
+        """提交预览请求，返回请求编号（之前未完成的请求作废）"""
+        with self._condition:
+            self._generation += 1
+            self._request = (self._generation, path, np.array(palette, dtype=np.uint8).reshape(-1, 3),
+                             metric, dither)
+            self._condition.notify()
+            return self._generation
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._generation += 1
+            self._condition.notify()
+
+    def _renderer(self, path):
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        renderer = self._renderers.get(key)
+        if renderer is None:
+            renderer = self._renderers[key] = PreviewRenderer(load_proxy(path, self.size))
+            while len(self._renderers) > PROXY_CACHE_SIZE:
+                self._renderers.popitem(last=False)
+        self._renderers.move_to_end(key)
+        return renderer
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._request is None and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                generation, path, palette, metric, dither = self._request
+                self._request = None
+
+            def stale():
+                return self._generation != generation
+
+            try:
+                image = self._renderer(path).render(palette, metric, dither, stale)
+            except Cancelled:
+                continue
+            except Exception as e:
+                # 任何错误都只影响本次请求，预览线程继续处理后续请求
+                if not stale():
+                    self.callback(generation, None, str(e))
+                continue
+            if not stale():
+                self.callback(generation, image, None)
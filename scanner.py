@@ -0,0 +1,103 @@
+"""图像文件扫描：基于 os.scandir 的生成器，边扫描边产出文件，不预先列出整个目录树"""
+import fnmatch
+import os
+
+# 按扩展名直接识别的图片格式
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.webp', '.npy')
+
+# 文件头特征：(偏移, 字节)
+_SIGNATURES = (
+    (0, b'\x89PNG\r\n\x1a\n'),
+    (0, b'\xff\xd8\xff'),
+    (0, b'GIF87a'),
+    (0, b'GIF89a'),
+    (0, b'BM'),
+    (0, b'II*\x00'),
+    (0, b'MM\x00*'),
+    (8, b'WEBP'),
+)
+_SNIFF_BYTES = 12
+
+
+def sniff_image(path):
+    """根据文件头判断是否为支持的图片格式"""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(_SNIFF_BYTES)
+    except OSError:
+        return False
+    return any(head[offset:offset + len(magic)] == magic for offset, magic in _SIGNATURES)
+
+
+def _matches(patterns, rel_path, name):
+    return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+
+class ImageScanner:
+    """遍历文件夹中的图片文件，count 为已发现的文件数（扫描中的动态总数）
+
+    include / exclude 为通配符列表，与相对路径（/分隔）或文件名匹配；exclude 同样用于剪除子文件夹。
+    扩展名不在 IMAGE_EXTENSIONS 中的文件在 sniff 为True时按文件头识别。
+    skip_dirs 中的文件夹（如位于输入目录内的输出文件夹）不会被扫描；与 skip_dirs 重叠的文件夹（如输出文件夹就是输入文件夹）
+    先列出全部条目再产出，运行中写入的输出文件不会被再次扫描到。
+    """
+
+    def __init__(self, root, recursive=True, include=None, exclude=None, sniff=True, skip_dirs=()):
+        self.root = root
+        self.recursive = recursive
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.sniff = sniff
+        self.skip_dirs = {os.path.abspath(d) for d in skip_dirs}
+        self.count = 0
+
+    def _is_image(self, entry):
+        if entry.name.lower().endswith(IMAGE_EXTENSIONS):
+            return True
+        return self.sniff and sniff_image(entry.path)
+
+    def _overlaps_skipped(self, folder):
+        """文件夹是否位于某个 skip_dirs 中，或包含某个 skip_dirs"""
+        folder = os.path.abspath(folder)
+        for skipped in self.skip_dirs:
+            try:
+                common = os.path.commonpath([folder, skipped])
+            except ValueError:  # Windows上不同盘符
+                continue
+            if common in (folder, skipped):
+                return True
+        return False
+
+    def __iter__(self):
+        stack = [self.root]
+        while stack:
+            folder = stack.pop()
+            try:
+                entries = os.scandir(folder)
+            except OSError:
+                continue  # 无权限或已被删除的文件夹直接跳过
+            subdirs = []
+            with entries:
+                if self._overlaps_skipped(folder):
+                    entries = list(entries)
+                for entry in entries:
+                    rel_path = os.path.relpath(entry.path, self.root).replace(os.sep, '/')
+                    if self.exclude and _matches(self.exclude, rel_path, entry.name):
+                        continue
+                    try:
+                        # 不跟随指向文件夹的符号链接，避免循环
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        is_file = not is_dir and entry.is_file()
+                    except OSError:
+                        continue
+                    if is_dir:
+                        if self.recursive and os.path.abspath(entry.path) not in self.skip_dirs:
+                            subdirs.append(entry.path)
+                    elif is_file:
+                        if self.include and not _matches(self.include, rel_path, entry.name):
+                            continue
+                        if self._is_image(entry):
+                            self.count += 1
+                            yield entry.path
+            # 倒序入栈，子文件夹按目录中出现的顺序深度优先处理
+            stack.extend(reversed(subdirs))
@@ -0,0 +1,266 @@
+"""颜色简化的批量处理（不依赖Qt，可在子进程中运行）"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from dithering import dither_indices
+from instrumentation import FileMetrics
+from palette_engine import create_engine
+from pipeline import Cancelled, run_pipeline
+from scanner import IMAGE_EXTENSIONS, ImageScanner
+from tile_stream import (DEFAULT_BUDGET_MB, image_size, indexed_image, needs_streaming,
+                         simplify_streaming, supports_indexed)
+
+# 流水线中解码和编码阶段的线程数（Pillow编解码时释放GIL）
+DECODE_THREADS = 2
+ENCODE_THREADS = 2
+
+
+def list_image_files(folder, recursive=False):
+    """列出文件夹中的图片文件（需要边扫描边处理时直接迭代 ImageScanner）"""
+    return list(ImageScanner(folder, recursive))
+
+
+def output_path_for(file_path, output_folder, root=None, prefix="simplified_"):
+    """输出文件路径：<prefix><原文件名>
+
+    指定 root 时在输出文件夹中保留相对 root 的子文件夹结构，避免不同子文件夹中的同名文件互相覆盖；
+    按文件头识别、扩展名无法用于保存的文件改为输出PNG。
+    """
+    name = f"{prefix}{os.path.basename(file_path)}"
+    if not name.lower().endswith(IMAGE_EXTENSIONS):
+        name += ".png"
+    if root is not None:
+        rel_dir = os.path.relpath(os.path.dirname(os.path.abspath(file_path)), os.path.abspath(root))
+        if rel_dir != os.curdir:
+            return os.path.join(output_folder, rel_dir, name)
+    return os.path.join(output_folder, name)
+
+
+def load_rgb(file_path):
+    """读取图像为 (H, W, 3) 的uint8数组"""
+    img = Image.open(file_path)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return np.array(img)
+
+
+def save_rgb(img_array, output_path):
+    """保存图像，输出子文件夹不存在时自动创建"""
+    os.makedirs(os.path.dirname(output_path) or os.curdir, exist_ok=True)
+    Image.fromarray(img_array).save(output_path)
+
+
+def save_indices(indices, palette, output_path, indexed=True):
+    """保存 (H, W) 的调色板索引
+
+    indexed 为True且格式支持时（PNG/GIF/BMP/TIFF，最多256色）保存为内嵌调色板的索引色图像，
+    文件更小、编码更快；否则展开为RGB保存。
+    """
+    if indexed and supports_indexed(output_path, len(palette)):
+        os.makedirs(os.path.dirname(output_path) or os.curdir, exist_ok=True)
+        # 不让Pillow重排调色板，保证索引与调色板一致
+        indexed_image(indices, palette).save(output_path, optimize=False)
+    else:
+        save_rgb(palette[indices], output_path)
+
+
+def _use_strips(file_path, memory_budget_mb):
+    """未压缩格式直接内存映射分条处理；其他格式超出内存预算时分条处理"""
+    return needs_streaming(file_path, memory_budget_mb)
+
+
+def _simplify_to(file_path, output_path, engine, memory_budget_mb, dither, indexed, progress=None):
+    if _use_strips(file_path, memory_budget_mb):
+        os.makedirs(os.path.dirname(output_path) or os.curdir, exist_ok=True)
+        return simplify_streaming(file_path, output_path, engine, memory_budget_mb or DEFAULT_BUDGET_MB,
+                                  dither, indexed, progress)
+
+    indices = dither_indices(load_rgb(file_path), engine, dither, progress)
+    save_indices(indices, engine.palette, output_path, indexed)
+    return output_path
+
+
+# 子进程中的映射引擎（每个进程只创建一次）、停止标志和进度队列
+_worker_engine = None
+_worker_cancel = None
+_worker_progress = None
+
+
+def _init_worker(palette, engine, engine_options, cancel_event, progress_queue):
+    global _worker_engine, _worker_cancel, _worker_progress
+    _worker_engine = create_engine(palette, engine, **engine_options)
+    _worker_cancel = cancel_event
+    _worker_progress = progress_queue
+
+
+def _worker_report(file_path):
+    """子进程中的进度回调：停止标志已设置时中止，否则把进度发回主进程"""
+    def report(fraction):
+        if _worker_cancel.is_set():
+            raise Cancelled()
+        if _worker_progress is not None:
+            _worker_progress.put((file_path, fraction))
+    return report
+
+
+def _simplify_in_worker(file_path, output_path, memory_budget_mb, dither, indexed):
+    """返回 (输出路径, 子进程CPU秒数)"""
+    cpu = time.process_time()
+    result = _simplify_to(file_path, output_path, _worker_engine, memory_budget_mb, dither, indexed,
+                          _worker_report(file_path))
+    return result, time.process_time() - cpu
+
+
+def _dither_in_worker(file_path, img_array, dither):
+    """返回 (调色板索引, 子进程CPU秒数)，索引只有RGB数据的1/3，进程间传输更快"""
+    cpu = time.process_time()
+    result = dither_indices(img_array, _worker_engine, dither, _worker_report(file_path))
+    return result, time.process_time() - cpu
+
+
+def _forward_progress(progress_queue, progress_callback):
+    """在主进程中把子进程发回的进度转交给回调，收到None时结束"""
+    for entry in iter(progress_queue.get, None):
+        progress_callback(*entry)
+
+
+def process_files(files, output_folder, palette, engine="lut", workers=1,
+                  should_stop=None, engine_options=None, memory_budget_mb=None, dither="none",
+                  stats=None, manifest=None, output_path_func=None, metrics_callback=None,
+                  profiler=None, indexed=True, progress_callback=None):
+    """处理一组文件，按完成顺序产出 (文件路径, 错误信息或None)
+
+    解码、映射、编码三个阶段组成流水线（见 pipeline.run_pipeline），读写与计算重叠进行；
+    workers > 1 时映射阶段使用进程池并行处理；should_stop 返回True时停止并取消未开始的任务；
+    memory_budget_mb 为每个进程处理单张图像的内存预算，超出时分条带处理（读写都在映射阶段完成），
+    BMP、未压缩TIFF和 .npy 等未压缩格式总是内存映射后分条带处理；
+    dither 为抖动模式；传入 PipelineStats 时记录各阶段的耗时；
+    传入 manifest.Manifest 时每完成一个文件立即记录结果，中途停止后可以从断点继续；
+    output_path_func(file_path) 给出输出路径，默认为 output_path_for(file_path, output_folder)。
+    files 可以是生成器（如 ImageScanner），流水线边读取边处理；
+    metrics_callback(dict) 在每个文件完成时收到 FileMetrics.to_dict() 记录（各阶段耗时、读写字节数、像素数）；
+    profiler 为 instrumentation.create_profiler 创建的性能分析钩子；
+    indexed 为True时支持的格式保存为索引色图像（见 save_indices）；
+    progress_callback(文件路径, 完成比例) 在映射过程中约每 dithering.PROGRESS_INTERVAL 秒调用一次
+    （可能来自不同线程）。映射在同样的间隔检查停止标志，停止后正在处理的图像（包括子进程中的）随即中止。
+    """
+    should_stop = should_stop or (lambda: False)
+    output_path_func = output_path_func or (lambda f: output_path_for(f, output_folder))
+    engine_options = engine_options or {}
+    workers = workers or os.cpu_count() or 1
+    palette = np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+
+    # 在创建进程池之前先创建一次引擎：不支持的引擎组合在这里直接报错，而不是每个子进程初始化时失败
+    local_engine = create_engine(palette, engine, **engine_options)
+    progress_queue = None
+    if workers == 1:
+        executor = None
+    else:
+        # 使用spawn启动子进程，避免在Qt线程中fork
+        context = multiprocessing.get_context("spawn")
+        cancel_event = context.Event()
+        if progress_callback is not None:
+            progress_queue = context.Queue()
+            threading.Thread(target=_forward_progress, args=(progress_queue, progress_callback),
+                             name="progress-forwarder", daemon=True).start()
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(palette, engine, engine_options, cancel_event, progress_queue)
+        )
+
+    metrics = {}
+
+    def report_for(file_path):
+        def report(fraction):
+            if should_stop():
+                raise Cancelled()
+            if progress_callback is not None:
+                progress_callback(file_path, fraction)
+        return report
+
+    def decode(file_path, _):
+        file_metrics = metrics[file_path] = FileMetrics(file_path)
+        file_metrics.bytes_read = os.path.getsize(file_path)
+        if _use_strips(file_path, memory_budget_mb):
+            return None
+        with file_metrics.measure('decode'):
+            img = Image.open(file_path)
+            img.load()
+        with file_metrics.measure('convert'):
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            img_array = np.array(img)
+        file_metrics.pixels = img_array.shape[0] * img_array.shape[1]
+        return img_array
+
+    def run_in_pool(file_metrics, stage, func, *args):
+        # 墙钟时间在本线程计量，CPU时间取子进程内的计量
+        wall = time.perf_counter()
+        result, cpu = executor.submit(func, *args).result()
+        file_metrics.add(stage, time.perf_counter() - wall, cpu)
+        return result
+
+    def compute(file_path, img_array):
+        file_metrics = metrics[file_path]
+        if img_array is None:
+            # 未压缩格式和超大图像分条带读取、映射并写出，不经过编码阶段
+            output_path = output_path_func(file_path)
+            width, height = image_size(file_path)
+            file_metrics.pixels = width * height
+            if executor is None:
+                with file_metrics.measure('stream'):
+                    _simplify_to(file_path, output_path, local_engine, memory_budget_mb, dither, indexed,
+                                 report_for(file_path))
+            else:
+                run_in_pool(file_metrics, 'stream', _simplify_in_worker, file_path, output_path,
+                            memory_budget_mb, dither, indexed)
+            file_metrics.bytes_written = os.path.getsize(output_path)
+            return None
+        if executor is None:
+            with file_metrics.measure('quantize'):
+                return dither_indices(img_array, local_engine, dither, report_for(file_path))
+        return run_in_pool(file_metrics, 'quantize', _dither_in_worker, file_path, img_array, dither)
+
+    def encode(file_path, indices):
+        if indices is not None:
+            file_metrics = metrics[file_path]
+            output_path = output_path_func(file_path)
+            with file_metrics.measure('encode'):
+                save_indices(indices, palette, output_path, indexed)
+            file_metrics.bytes_written = os.path.getsize(output_path)
+
+    wrap = profiler.wrap if profiler is not None else (lambda func: func)
+    stages = [
+        ("decode", wrap(decode), DECODE_THREADS),
+        ("compute", wrap(compute), workers),
+        ("encode", wrap(encode), ENCODE_THREADS),
+    ]
+    if profiler is not None:
+        profiler.start()
+    try:
+        for file_path, error in run_pipeline(files, stages, should_stop, queue_size=max(2, workers),
+                                             stats=stats):
+            if manifest is not None:
+                manifest.record(file_path, output_path_func(file_path), error)
+            file_metrics = metrics.pop(file_path, None) or FileMetrics(file_path)
+            if metrics_callback is not None:
+                file_metrics.error = error
+                metrics_callback(file_metrics.to_dict())
+            yield file_path, error
+    finally:
+        if executor is not None:
+            # 停止时取消尚未开始的任务，正在处理的文件在子进程下一次检查停止标志时中止，不等待
+            cancel_event.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            if progress_queue is not None:
+                progress_queue.put(None)
+        if profiler is not None:
+            profiler.stop()
@@ -0,0 +1,220 @@
+"""颜色简化命令行入口（不导入Qt，可在无显示环境中运行）
+
+用法示例:
+    python -m simplify_cli "photos/*.jpg" scans -o out -p "#FF0000,#00FF00,#0000FF" -j 8 -r
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+from color_metrics import METRICS
+from dithering import DITHER_MODES
+from instrumentation import JsonLinesSink, create_profiler
+from palette_engine import ENGINES, PRESET_COLORS, check_engine, parse_hex_colors
+from palette_library import PaletteLibrary
+from manifest import Manifest
+from pipeline import PipelineStats
+from scanner import IMAGE_EXTENSIONS, ImageScanner, sniff_image
+from simplify_batch import output_path_for, process_files
+from tile_stream import DEFAULT_BUDGET_MB
+
+
+def glob_root(pattern):
+    """通配符中不含通配符的前缀文件夹（'in/**/a.png' 为 'in'），不含通配符时返回None"""
+    if not glob.has_magic(pattern):
+        return None
+    root = pattern
+    while glob.has_magic(root):
+        root = os.path.dirname(root)
+    return root or os.curdir
+
+
+def expand_inputs(patterns, recursive=False, include=None, exclude=None, skip_dirs=()):
+    """展开输入的通配符和文件夹，逐个产出去重后的 (文件路径, 所属输入文件夹或None)
+
+    通配符匹配的文件和文件夹以通配符的前缀文件夹为根，输出时保留其下的子文件夹结构，
+    不同子文件夹中的同名文件不会互相覆盖。文件夹边扫描边产出，不等待整个目录树列完。
+    """
+    seen = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=recursive) or [pattern]
+        pattern_root = glob_root(pattern)
+        for path in sorted(matches):
+            if os.path.isdir(path):
+                root = pattern_root or path
+                candidates = ImageScanner(path, recursive, include, exclude, skip_dirs=skip_dirs)
+            elif os.path.isfile(path) and (path.lower().endswith(IMAGE_EXTENSIONS) or sniff_image(path)):
+                root = pattern_root
+                candidates = [path]
+            else:
+                continue
+            for file_path in candidates:
+                key = os.path.abspath(file_path)
+                if key not in seen:
+                    seen.add(key)
+                    yield file_path, root
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m simplify_cli",
+        description="将图片中的颜色简化为指定调色板中最接近的颜色"
+    )
+    parser.add_argument("inputs", nargs="+", help="输入文件、文件夹或通配符（如 'photos/*.jpg'）")
+    parser.add_argument("-o", "--output", required=True, help="输出文件夹（不存在时自动创建）")
+    parser.add_argument("-p", "--palette", action="append", default=[],
+                        help="16进制颜色代码，用逗号分隔，可重复指定")
+    parser.add_argument("--preset", action="store_true", help="加入预设的12种颜色")
+    parser.add_argument("--saved", action="append", default=[], metavar="NAME",
+                        help="加入调色板库中已保存的调色板，可重复指定")
+    parser.add_argument("--save-palette", metavar="NAME",
+                        help="将本次使用的调色板保存到调色板库，并为 --metric 预先构建查找表")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="并行进程数（默认为CPU核数）")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="递归处理子文件夹（输出时保留子文件夹结构），并允许通配符中使用 **")
+    parser.add_argument("--include", action="append", default=[],
+                        help="只处理与通配符匹配的文件（匹配相对路径或文件名），可重复指定")
+    parser.add_argument("--exclude", action="append", default=[],
+                        help="跳过与通配符匹配的文件和子文件夹，可重复指定")
+    parser.add_argument("--memory-mb", type=float, default=DEFAULT_BUDGET_MB,
+                        help=f"每个进程处理单张图像的内存预算，超出时分条带处理（默认 {DEFAULT_BUDGET_MB}）")
+    parser.add_argument("--metric", choices=METRICS, default="rgb",
+                        help="颜色距离算法：rgb、redmean、lab76 (ΔE76)、de2000 (CIEDE2000)（默认 rgb）")
+    parser.add_argument("--engine", choices=sorted(ENGINES) + ["auto"], default="auto",
+                        help="映射引擎，各引擎结果相同（默认 auto，按图像和调色板大小选择；"
+                             "pillow 和 numba 只支持 rgb 距离，numba 需要安装 numba）")
+    parser.add_argument("--dither", choices=DITHER_MODES, default="none",
+                        help="抖动模式：none、bayer（有序抖动）、floyd-steinberg、atkinson（默认 none）")
+    parser.add_argument("--force", action="store_true",
+                        help="重新处理所有文件（默认跳过输出文件夹清单中记录的未变化文件）")
+    parser.add_argument("--timings", action="store_true", help="结束时输出解码、映射、编码各阶段的耗时")
+    parser.add_argument("--rgb-output", action="store_true",
+                        help="始终保存为24位RGB（默认PNG/GIF/BMP/TIFF在不超过256色时保存为索引色图像）")
+    parser.add_argument("--metrics-jsonl", metavar="PATH",
+                        help="将每个文件各阶段的耗时、读写字节数和像素数写为JSON Lines（'-' 表示标准错误）")
+    parser.add_argument("--profile", choices=("cprofile", "sample"),
+                        help="性能分析：cprofile 分析各阶段函数（-j 1 时包含映射；Python 3.12+ 改为 sample），"
+                             "sample 定时采样所有线程的调用栈")
+    parser.add_argument("--profile-output", default="simplify.prof",
+                        help="性能分析结果文件（cprofile 为pstats格式，sample 为折叠栈文本；默认 simplify.prof）")
+    parser.add_argument("-q", "--quiet", action="store_true", help="只输出错误信息")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    color_hex_list = [c for value in args.palette for c in value.split(',') if c.strip()]
+    if args.preset:
+        color_hex_list.extend(PRESET_COLORS)
+    library = PaletteLibrary() if args.saved or args.save_palette else None
+    for name in args.saved:
+        try:
+            color_hex_list.extend(library.colors(name))
+        except KeyError:
+            print(f"错误: 调色板库中没有“{name}”（可用: {', '.join(library.names())}）", file=sys.stderr)
+            return 2
+    try:
+        palette = parse_hex_colors(color_hex_list)
+    except ValueError:
+        print("错误: 颜色代码无效，请使用 #RGB 或 #RRGGBB 格式", file=sys.stderr)
+        return 2
+    if len(palette) == 0:
+        print("错误: 没有有效的颜色代码！", file=sys.stderr)
+        return 2
+    if args.save_palette:
+        try:
+            library.save(args.save_palette, color_hex_list, metrics=(args.metric,))
+        except (OSError, ValueError) as e:
+            print(f"错误: 保存调色板失败: {e}", file=sys.stderr)
+            return 2
+
+    if args.workers < 1:
+        print("错误: 进程数必须大于0", file=sys.stderr)
+        return 2
+
+    try:
+        check_engine(args.engine, len(palette), args.metric)
+    except ValueError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+
+    os.makedirs(args.output, exist_ok=True)
+
+    # 边扫描边处理：记录每个文件所属的输入文件夹，用于在输出中保留子文件夹结构
+    roots = {}
+    found = [0]
+    collisions = [0]
+    claimed = {}  # 输出路径 -> 输入文件
+
+    def discovered():
+        for file_path, root in expand_inputs(args.inputs, args.recursive, args.include, args.exclude,
+                                             skip_dirs=(args.output,)):
+            roots[file_path] = root
+            found[0] += 1
+            # 不同输入（如两个输入文件夹中的同名文件）的输出路径相同时跳过后来的文件，避免覆盖
+            target = os.path.abspath(output_path(file_path))
+            other = claimed.setdefault(target, file_path)
+            if other != file_path:
+                collisions[0] += 1
+                print(f"错误: {file_path} 与 {other} 的输出文件相同（{target}），已跳过", file=sys.stderr)
+                continue
+            yield file_path
+
+    def output_path(file_path):
+        return output_path_for(file_path, args.output, roots.get(file_path))
+
+    start = time.perf_counter()
+    indexed = not args.rgb_output
+    manifest = Manifest(args.output, palette, {"metric": args.metric, "dither": args.dither, "indexed": indexed})
+    files = discovered()
+    if not args.force:
+        files = manifest.filter_pending(files, output_path)
+
+    stats = PipelineStats()
+    metrics_sink = JsonLinesSink(args.metrics_jsonl) if args.metrics_jsonl else None
+    profiler = create_profiler(args.profile, args.profile_output) if args.profile else None
+    failed = 0
+    results = process_files(files, args.output, palette, args.engine, args.workers,
+                            engine_options={"metric": args.metric}, memory_budget_mb=args.memory_mb,
+                            dither=args.dither, indexed=indexed, stats=stats, manifest=manifest,
+                            output_path_func=output_path, metrics_callback=metrics_sink,
+                            profiler=profiler)
+    idx = 0
+    try:
+        for idx, (file_path, error) in enumerate(results, 1):
+            # 总数为目前已发现的文件数，扫描结束前会继续增长
+            progress = f"[{idx + manifest.skipped}/{found[0]}]"
+            if error is None:
+                if not args.quiet:
+                    print(f"{progress} {file_path}")
+            else:
+                failed += 1
+                print(f"{progress} 处理 {file_path} 时出错: {error}", file=sys.stderr)
+    except KeyboardInterrupt:
+        results.close()
+        print("处理已停止", file=sys.stderr)
+        return 130
+    finally:
+        manifest.close()
+        if metrics_sink is not None:
+            metrics_sink.close()
+
+    if not found[0]:
+        print("错误: 没有找到图片文件", file=sys.stderr)
+        return 1
+    if args.timings:
+        print(stats.summary(), file=sys.stderr)
+    succeeded = idx - failed
+    failed += collisions[0]
+    if not args.quiet:
+        print(f"完成: {succeeded} 成功, {failed} 失败, 跳过 {manifest.skipped} 个未变化的文件, "
+              f"用时 {time.perf_counter() - start:.2f} 秒")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
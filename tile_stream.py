@@ -0,0 +1,587 @@
+"""超大图像的分条处理：按行条带解码、映射、写出，峰值内存与图像尺寸无关
+
+BMP、PPM、未压缩TIFF和 .npy 直接内存映射文件按行读取，不经过Pillow解码；
+非隔行的8位PNG边解压边按行还原；BMP和 .npy 输出同样写入内存映射的文件。
+"""
+import os
+import struct
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+from PIL import Image
+
+from dithering import create_ditherer, map_strip
+
+# 默认的单图内存预算（MB），超过时改为分条处理
+DEFAULT_BUDGET_MB = 256
+
+# 可以保存为索引色（调色板模式）的格式，最多256种颜色
+INDEXED_EXTENSIONS = ('.png', '.gif', '.bmp', '.tif', '.tiff')
+MAX_INDEXED_COLORS = 256
+
+# 每个像素在处理一个条带时大约占用的字节数（输入、索引、输出、编码缓冲）
+_BYTES_PER_PIXEL = 16
+
+# 可以直接从文件按行读取的未压缩排列：rawmode -> (每像素字节数, RGB通道位置)
+_RAW_LAYOUTS = {
+    'RGB': (3, [0, 1, 2]),
+    'BGR': (3, [2, 1, 0]),
+    'RGBX': (4, [0, 1, 2]),
+    'RGBA': (4, [0, 1, 2]),
+    'BGRX': (4, [2, 1, 0]),
+    'BGRA': (4, [2, 1, 0]),
+    'L': (1, [0, 0, 0]),
+}
+
+# 可以逐行解码的PNG颜色类型（8位、非隔行）：颜色类型 -> (每像素字节数, Pillow模式)
+_PNG_ROW_MODES = {0: (1, 'L'), 2: (3, 'RGB'), 3: (1, 'P'), 4: (2, 'LA'), 6: (4, 'RGBA')}
+
+# 逐行解码PNG时每次从文件读取的压缩数据字节数
+_PNG_READ_SIZE = 1 << 20
+
+
+def rows_per_strip(width, budget_mb=DEFAULT_BUDGET_MB):
+    """根据内存预算计算每个条带的行数"""
+    return max(1, int(budget_mb * 1024 * 1024) // (max(width, 1) * _BYTES_PER_PIXEL))
+
+
+@contextmanager
+def without_pixel_limit():
+    """临时关闭Pillow的像素数量检查（只读取文件头或自行限制解码尺寸时使用），是否整图解码由调用方决定"""
+    limit = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        yield
+    finally:
+        Image.MAX_IMAGE_PIXELS = limit
+
+
+def _raw_tiles(image):
+    """解析原始排列的图块，返回 [(y0, y1, 偏移, rawmode, 行字节数, 方向)]，不支持时返回None"""
+    tiles = []
+    width = image.size[0]
+    for tile in image.tile:
+        codec, extents, offset, args = tile[:4]
+        if isinstance(args, str):
+            args = (args, 0, 1)
+        rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+        x0, y0, x1, y1 = extents
+        if codec != 'raw' or rawmode not in _RAW_LAYOUTS or x0 != 0 or x1 != width:
+            return None
+        if rawmode == 'L' and image.mode != 'L':
+            return None  # 调色板图像需要查表，交给Pillow处理
+        bpp, _ = _RAW_LAYOUTS[rawmode]
+        tiles.append((y0, y1, offset, rawmode, stride or width * bpp, orientation))
+    return tiles or None
+
+
+def _load_npy(path):
+    """内存映射 .npy 图像，只支持 (H, W) 或 (H, W, 1/3/4) 的uint8数组"""
+    array = np.load(path, mmap_mode='r')
+    if (array.dtype != np.uint8 or array.ndim not in (2, 3) or
+            (array.ndim == 3 and array.shape[2] not in (1, 3, 4))):
+        raise ValueError(f"不支持的 .npy 图像: dtype={array.dtype}, shape={array.shape}")
+    return array
+
+
+class _PngRows:
+    """非隔行8位PNG的流式解码：IDAT数据边读边解压，每次只还原请求的行，峰值内存与图像高度无关
+
+    滤波的还原交给Pillow的zip解码器（C实现）：把上一行（不滤波）和本条带的各行重新打包为不压缩的zlib流，
+    解码后去掉第一行。按从上到下的顺序读取最快，向回读取时从头重新解压。
+    """
+
+    def __init__(self, path, width, height, color_type, palette, idat_offset):
+        self.width = width
+        self.height = height
+        self._bpp, self._mode = _PNG_ROW_MODES[color_type]
+        self._stride = width * self._bpp
+        self._palette = palette
+        self._idat_offset = idat_offset
+        self._file = open(path, 'rb')
+        self._rewind()
+
+    @classmethod
+    def open(cls, path):
+        """解析文件头，支持逐行解码时返回 _PngRows，否则（16位、低位深、隔行等）返回None"""
+        with open(path, 'rb') as f:
+            if f.read(8) != b'\x89PNG\r\n\x1a\n':
+                return None
+            palette = None
+            header = None
+            while True:
+                head = f.read(8)
+                if len(head) < 8:
+                    return None
+                length, chunk_type = struct.unpack('>I4s', head)
+                if chunk_type == b'IDAT':
+                    break
+                data = f.read(length)
+                f.seek(4, os.SEEK_CUR)  # CRC
+                if chunk_type == b'IHDR':
+                    header = struct.unpack('>IIBBBBB', data[:13])
+                elif chunk_type == b'PLTE':
+                    palette = np.zeros((256, 3), dtype=np.uint8)
+                    colors = np.frombuffer(data, dtype=np.uint8)[:768].reshape(-1, 3)
+                    palette[:len(colors)] = colors
+            idat_offset = f.tell() - 8
+        if header is None:
+            return None
+        width, height, depth, color_type, _, _, interlace = header
+        if depth != 8 or interlace != 0 or color_type not in _PNG_ROW_MODES:
+            return None
+        if color_type == 3 and palette is None:
+            return None
+        return cls(path, width, height, color_type, palette, idat_offset)
+
+    def _rewind(self):
+        self._file.seek(self._idat_offset)
+        self._chunks = self._compressed()
+        self._decompressor = zlib.decompressobj()
+        self._tail = b''
+        self._previous = bytes(self._stride)  # 第一行之前视为全0的行
+        self.next_row = 0
+
+    def _compressed(self):
+        """依次产出连续的IDAT块中的压缩数据（大块分段读取）"""
+        while True:
+            head = self._file.read(8)
+            if len(head) < 8:
+                return
+            length, chunk_type = struct.unpack('>I4s', head)
+            if chunk_type != b'IDAT':
+                return
+            while length:
+                data = self._file.read(min(length, _PNG_READ_SIZE))
+                if not data:
+                    return
+                length -= len(data)
+                yield data
+            self._file.seek(4, os.SEEK_CUR)  # CRC
+
+    def _filtered(self, rows):
+        """解压接下来 rows 行的滤波数据（每行开头为滤波类型）"""
+        need = rows * (self._stride + 1)
+        out = bytearray()
+        while len(out) < need:
+            if not self._tail:
+                self._tail = next(self._chunks, b'')
+                if not self._tail:
+                    raise ValueError("PNG图像数据不完整")
+            out += self._decompressor.decompress(self._tail, need - len(out))
+            self._tail = self._decompressor.unconsumed_tail
+        return out
+
+    def _decode(self, rows):
+        """还原接下来 rows 行，返回文件中的像素排列 (行数, 宽, 每像素字节数)"""
+        data = zlib.compress(b'\x00' + self._previous + self._filtered(rows), 0)
+        image = Image.frombytes(self._mode, (self.width, rows + 1), data, 'zip', self._mode)
+        pixels = np.asarray(image).reshape(rows + 1, self.width, self._bpp)[1:]
+        self._previous = pixels[-1].tobytes()
+        self.next_row += rows
+        return pixels
+
+    def read(self, top, bottom):
+        """读取 [top, bottom) 行，返回 (行数, 宽, 3) 的uint8 RGB数组"""
+        if top < self.next_row:
+            self._rewind()
+        while self.next_row < top:
+            self._decode(min(top - self.next_row, max(1, _PNG_READ_SIZE // (self._stride + 1))))
+        pixels = self._decode(bottom - top)
+        if self._mode == 'P':
+            return self._palette[pixels[:, :, 0]]
+        if self._bpp <= 2:
+            return np.repeat(pixels[:, :, :1], 3, axis=2)
+        return np.ascontiguousarray(pixels[:, :, :3])
+
+    def close(self):
+        self._file.close()
+
+
+class StripReader:
+    """按行条带读取图像，返回 (行数, 宽, 3) 的uint8 RGB数组
+
+    .npy 以及BMP、PPM和未压缩TIFF等原始排列的文件内存映射后按行读取，只复制当前条带；
+    非隔行的8位PNG边解压边还原当前条带（不受Pillow像素数量限制）；
+    其他格式（JPEG、压缩TIFF、16位或隔行PNG）无法部分解码，只能整图解码一次后按条带切取。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.image = None
+        self._maps = []
+        self._png = None
+        if path.lower().endswith('.npy'):
+            self._npy = _load_npy(path)
+            self.height, self.width = self._npy.shape[:2]
+            self._raw_tiles = None
+            return
+        self._npy = None
+        with without_pixel_limit():
+            self.image = Image.open(path)
+        self.width, self.height = self.image.size
+        self._raw_tiles = _raw_tiles(self.image)
+        if self._raw_tiles is None and self.image.format == 'PNG':
+            self._png = _PngRows.open(path)
+            if self._png is not None:
+                return
+
+        if self._raw_tiles is not None:
+            # 每个图块映射为 (行数, 行字节数) 的只读数组
+            self._maps = [np.memmap(path, dtype=np.uint8, mode='r', offset=offset, shape=(y1 - y0, stride))
+                          for y0, y1, offset, _, stride, _ in self._raw_tiles]
+        else:
+            limit = Image.MAX_IMAGE_PIXELS
+            if limit and self.width * self.height > 2 * limit:
+                raise Image.DecompressionBombError(
+                    f"图像像素数 ({self.width * self.height}) 超过限制，且该格式不支持分条读取"
+                )
+            if self.image.mode != 'RGB':
+                self.image = self.image.convert('RGB')
+            else:
+                self.image.load()
+
+    def read(self, top, bottom):
+        """读取 [top, bottom) 行"""
+        if self._png is not None:
+            return self._png.read(top, bottom)
+        if self._npy is not None:
+            rows = self._npy[top:bottom]
+            if rows.ndim == 2:
+                rows = rows[:, :, None]
+            if rows.shape[2] == 1:
+                return np.repeat(rows, 3, axis=2)
+            return np.array(rows[:, :, :3])
+
+        if self._raw_tiles is None:
+            return np.asarray(self.image.crop((0, top, self.width, bottom)))
+
+        strip = np.empty((bottom - top, self.width, 3), dtype=np.uint8)
+        for (y0, y1, _, rawmode, stride, orientation), mapped in zip(self._raw_tiles, self._maps):
+            start, end = max(top, y0), min(bottom, y1)
+            if start >= end:
+                continue
+            bpp, channels = _RAW_LAYOUTS[rawmode]
+            if orientation < 0:
+                # 自下而上存储（如BMP）：文件中先出现的是最后一行
+                rows = mapped[y1 - end:y1 - start][::-1]
+            else:
+                rows = mapped[start - y0:end - y0]
+            rows = rows[:, :self.width * bpp].reshape(end - start, self.width, bpp)
+            strip[start - top:end - top] = rows[:, :, channels]
+        return strip
+
+    def close(self):
+        self._maps = []
+        self._npy = None
+        if self._png is not None:
+            self._png.close()
+        if self.image is not None:
+            self.image.close()
+
+
+def _png_chunk(chunk_type, data):
+    return (struct.pack('>I', len(data)) + chunk_type + data +
+            struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+
+
+def supports_indexed(path, palette_size):
+    """输出格式和调色板大小是否允许保存为索引色"""
+    return (palette_size <= MAX_INDEXED_COLORS and
+            os.path.splitext(path)[1].lower() in INDEXED_EXTENSIONS)
+
+
+def indexed_image(indices, palette):
+    """由 (H, W) 的调色板索引创建Pillow的P模式图像"""
+    img = Image.fromarray(np.ascontiguousarray(indices, dtype=np.uint8), 'P')
+    img.putpalette(np.asarray(palette, dtype=np.uint8).reshape(-1).tobytes())
+    return img
+
+
+class PngStripWriter:
+    """逐条带写出8位RGB PNG（zlib流式压缩，不保留整图）
+
+    指定 palette 时写出索引色PNG，write 接收 (行数, 宽) 的调色板索引。
+    """
+
+    def __init__(self, path, width, height, compress_level=6, palette=None):
+        self.width = width
+        self.height = height
+        self.palette = palette
+        self._file = open(path, 'wb')
+        self._compressor = zlib.compressobj(compress_level)
+        self._file.write(b'\x89PNG\r\n\x1a\n')
+        color_type = 2 if palette is None else 3
+        self._file.write(_png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)))
+        if palette is not None:
+            self._file.write(_png_chunk(b'PLTE', np.asarray(palette, dtype=np.uint8).tobytes()))
+
+    def write(self, rows):
+        """写入 (行数, 宽, 3) 的uint8数组"""
+        n = len(rows)
+        if self.palette is not None:
+            # 索引值之间的差值没有意义，不使用滤波
+            filtered = np.zeros((n, self.width + 1), dtype=np.uint8)
+            filtered[:, 1:] = rows
+            data = self._compressor.compress(filtered.tobytes())
+            if data:
+                self._file.write(_png_chunk(b'IDAT', data))
+            return
+        flat = rows.reshape(n, -1)
+        # 每行使用Sub滤波（与左侧像素的差值），可以整行向量化计算
+        filtered = np.empty((n, flat.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 1
+        filtered[:, 1:4] = flat[:, :3]
+        np.subtract(flat[:, 3:], flat[:, :-3], out=filtered[:, 4:])
+        data = self._compressor.compress(filtered.tobytes())
+        if data:
+            self._file.write(_png_chunk(b'IDAT', data))
+
+    def close(self):
+        self._file.write(_png_chunk(b'IDAT', self._compressor.flush()))
+        self._file.write(_png_chunk(b'IEND', b''))
+        self._file.close()
+
+
+class TiffStripWriter:
+    """逐条带写出RGB TIFF，每个条带单独用deflate压缩
+
+    指定 palette 时写出调色板TIFF（Photometric=3），write 接收 (行数, 宽) 的调色板索引。
+    """
+
+    def __init__(self, path, width, height, rows_per_strip, palette=None):
+        self.width = width
+        self.height = height
+        self.rows_per_strip = rows_per_strip
+        self.palette = palette
+        self._file = open(path, 'wb')
+        self._file.write(b'II*\x00\x00\x00\x00\x00')  # IFD偏移在关闭时回填
+        self._offsets = []
+        self._counts = []
+
+    def write(self, rows):
+        """写入 (行数, 宽, 3) 的uint8数组，行数需与 rows_per_strip 一致（最后一条除外）"""
+        data = zlib.compress(np.ascontiguousarray(rows).tobytes(), 6)
+        offset = self._file.tell()
+        if offset + len(data) >= 1 << 32:
+            raise ValueError("输出超过4GB，普通TIFF无法保存")
+        self._offsets.append(offset)
+        self._counts.append(len(data))
+        self._file.write(data)
+
+    def close(self):
+        f = self._file
+        n = len(self._offsets)
+
+        def write_array(fmt, values):
+            if f.tell() % 2:
+                f.write(b'\x00')
+            pos = f.tell()
+            f.write(struct.pack(f'<{len(values)}{fmt}', *values))
+            return pos
+
+        offsets_pos = write_array('I', self._offsets) if n > 1 else self._offsets[0]
+        counts_pos = write_array('I', self._counts) if n > 1 else self._counts[0]
+
+        # (标签, 类型, 数量, 值)，类型 3=SHORT, 4=LONG
+        if self.palette is None:
+            bits_pos = write_array('H', [8, 8, 8])
+            entries = [(258, 3, 3, bits_pos), (262, 3, 1, 2), (277, 3, 1, 3)]  # RGB
+        else:
+            # 颜色表为256项16位值，依次为全部R、全部G、全部B
+            colormap = np.zeros((3, 256), dtype=np.uint16)
+            colormap[:, :len(self.palette)] = np.asarray(self.palette, dtype=np.uint16).T * 257
+            colormap_pos = write_array('H', colormap.ravel().tolist())
+            entries = [(258, 3, 1, 8), (262, 3, 1, 3), (277, 3, 1, 1), (320, 3, 768, colormap_pos)]
+        entries += [
+            (256, 4, 1, self.width),
+            (257, 4, 1, self.height),
+            (259, 3, 1, 8),  # Adobe deflate
+            (273, 4, n, offsets_pos),
+            (278, 4, 1, self.rows_per_strip),
+            (279, 4, n, counts_pos),
+            (284, 3, 1, 1),
+        ]
+        entries.sort()  # IFD中的标签必须按升序排列
+        if f.tell() % 2:
+            f.write(b'\x00')
+        ifd_pos = f.tell()
+        f.write(struct.pack('<H', len(entries)))
+        for tag, type_, count, value in entries:
+            if type_ == 3 and count == 1:
+                f.write(struct.pack('<HHIHH', tag, type_, count, value, 0))
+            else:
+                f.write(struct.pack('<HHII', tag, type_, count, value))
+        f.write(struct.pack('<I', 0))
+        f.seek(4)
+        f.write(struct.pack('<I', ifd_pos))
+        f.close()
+
+
+class BmpStripWriter:
+    """逐条带写出24位BMP（高度写为负数，行按自上而下顺序存储）
+
+    像素区域内存映射后直接写入，不经过中间缓冲。
+    指定 palette 时写出8位索引色BMP，write 接收 (行数, 宽) 的调色板索引。
+    """
+
+    def __init__(self, path, width, height, palette=None):
+        self.width = width
+        self.height = height
+        self.palette = palette
+        channels = 3 if palette is None else 1
+        self._stride = (width * channels + 3) // 4 * 4
+        image_size = self._stride * height
+        table = b'' if palette is None else self._color_table(palette)
+        data_offset = 54 + len(table)
+        if data_offset + image_size >= 1 << 32:
+            raise ValueError("输出超过4GB，BMP无法保存")
+        with open(path, 'wb') as f:
+            f.write(struct.pack('<2sIHHI', b'BM', data_offset + image_size, 0, 0, data_offset))
+            f.write(struct.pack('<IiiHHIIiiII', 40, width, -height, 1, 8 * channels, 0, image_size,
+                                2835, 2835, 0 if palette is None else len(palette), 0))
+            f.write(table)
+            f.truncate(data_offset + image_size)
+        self._pixels = np.memmap(path, dtype=np.uint8, mode='r+', offset=data_offset,
+                                 shape=(height, self._stride)) if image_size else None
+        self._row = 0
+
+    @staticmethod
+    def _color_table(palette):
+        table = np.zeros((len(palette), 4), dtype=np.uint8)
+        table[:, :3] = np.asarray(palette, dtype=np.uint8)[:, ::-1]  # BGR0
+        return table.tobytes()
+
+    def write(self, rows):
+        """写入 (行数, 宽, 3) 的uint8数组"""
+        target = self._pixels[self._row:self._row + len(rows)]
+        self._row += len(rows)
+        if self.palette is None:
+            target[:, :self.width * 3] = rows[:, :, ::-1].reshape(len(rows), -1)
+        else:
+            target[:, :self.width] = rows
+
+    def close(self):
+        if self._pixels is not None:
+            self._pixels.flush()
+            self._pixels = None
+
+
+class NpyStripWriter:
+    """逐条带写出 (H, W, 3) 的uint8 .npy 文件（内存映射写入）"""
+
+    def __init__(self, path, width, height):
+        self._array = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=(height, width, 3))
+        self._row = 0
+
+    def write(self, rows):
+        self._array[self._row:self._row + len(rows)] = rows
+        self._row += len(rows)
+
+    def close(self):
+        self._array.flush()
+        self._array = None
+
+
+class _ArrayWriter:
+    """不支持分条写出的格式：在内存中拼接结果后交给Pillow保存"""
+
+    def __init__(self, path, width, height, palette=None):
+        self.path = path
+        self.palette = palette
+        shape = (height, width) if palette is not None else (height, width, 3)
+        self._array = np.empty(shape, dtype=np.uint8)
+        self._row = 0
+
+    def write(self, rows):
+        self._array[self._row:self._row + len(rows)] = rows
+        self._row += len(rows)
+
+    def close(self):
+        if self.palette is not None:
+            indexed_image(self._array, self.palette).save(self.path, optimize=False)
+        else:
+            Image.fromarray(self._array).save(self.path)
+
+
+def open_strip_writer(path, width, height, rows_per_strip, palette=None):
+    """按输出扩展名选择写出方式；palette 不为None时写出索引色图像"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.png':
+        return PngStripWriter(path, width, height, palette=palette)
+    if ext in ('.tif', '.tiff'):
+        return TiffStripWriter(path, width, height, rows_per_strip, palette=palette)
+    if ext == '.bmp':
+        return BmpStripWriter(path, width, height, palette=palette)
+    if ext == '.npy':
+        return NpyStripWriter(path, width, height)
+    return _ArrayWriter(path, width, height, palette=palette)
+
+
+def image_size(file_path):
+    """只读取文件头，返回 (宽, 高)"""
+    if file_path.lower().endswith('.npy'):
+        height, width = _load_npy(file_path).shape[:2]
+        return width, height
+    with without_pixel_limit():
+        with Image.open(file_path) as img:
+            return img.size
+
+
+def needs_streaming(file_path, budget_mb=DEFAULT_BUDGET_MB):
+    """只读取一次文件头，判断是否分条带处理
+
+    .npy 以及BMP、PPM、未压缩TIFF等可以内存映射的格式总是分条处理；其他格式在整图处理会超出内存预算时分条处理，
+    budget_mb 为None时不分条。
+    """
+    if file_path.lower().endswith('.npy'):
+        return True  # .npy 只能通过内存映射读取
+    try:
+        with without_pixel_limit():
+            with Image.open(file_path) as img:
+                if _raw_tiles(img) is not None:
+                    return True
+                width, height = img.size
+    except OSError:
+        return False  # 交给整图解码时报告错误
+    return bool(budget_mb) and width * height * _BYTES_PER_PIXEL > budget_mb * 1024 * 1024
+
+
+def simplify_streaming(file_path, output_path, engine, budget_mb=DEFAULT_BUDGET_MB, dither="none",
+                       indexed=False, progress=None):
+    """分条带映射并写出图像，抖动状态（误差、阈值矩阵位置）在条带间延续
+
+    indexed 为True且输出格式支持时写出索引色图像。
+    progress(已完成比例) 在条带内约每 dithering.PROGRESS_INTERVAL 秒调用一次，在其中抛出异常即可中止，
+    中止或出错时删除写了一半的输出文件。
+    """
+    ditherer = create_ditherer(engine, dither)
+    palette = engine.palette if indexed and supports_indexed(output_path, len(engine.palette)) else None
+    reader = StripReader(file_path)
+    try:
+        step = rows_per_strip(reader.width, budget_mb)
+        height = reader.height
+        writer = open_strip_writer(output_path, reader.width, height, step, palette)
+        completed = False
+        try:
+            for top in range(0, height, step):
+                bottom = min(top + step, height)
+                strip = reader.read(top, bottom)
+                strip_progress = None
+                if progress is not None:
+                    def strip_progress(fraction, top=top, rows=bottom - top):
+                        progress((top + fraction * rows) / height)
+                indices = map_strip(strip, engine, ditherer, strip_progress)
+                writer.write(indices if palette is not None else engine.palette[indices])
+            completed = True
+        finally:
+            writer.close()
+            if not completed:
+                try:
+                    os.remove(output_path)
+                except OSError:
+                    pass
+    finally:
+        reader.close()
+    return output_path
@@ -1,7 +1,105 @@
+import collections
+import queue
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import filedialog, messagebox
 from PIL import Image, ImageTk
 
+import pixel_art
+
+# 交互时用于生成预览的代理图像最长边（保存时仍使用原图）
+PROXY_SIZE = 1600
+
+# 缓存的原图预览数量（按预览尺寸）
+ORIGINAL_CACHE_SIZE = 4
+
+# 缓存的像素画预览数量（按像素大小、模式和预览尺寸）
+PREVIEW_CACHE_SIZE = 32
+
+# 滑块或窗口大小事件之后等待的毫秒数，期间的事件合并为一次渲染
+RENDER_DELAY_MS = 30
+
+# 检查后台渲染结果的间隔（毫秒）
+POLL_INTERVAL_MS = 15
+
+# 块颜色计算方式在界面中显示的名称
+MODE_NAMES = {
+    "mean": "平均色",
+    "median": "中位数",
+    "mode": "主色（出现最多）",
+    "nearest": "最近邻",
+}
+
+
+def fit_size(size, max_width, max_height):
+    """保持宽高比缩放到预览区域内的尺寸"""
+    width, height = size
+    ratio = min(max_width / width, max_height / height)
+    return max(1, int(width * ratio)), max(1, int(height * ratio))
+
+
+def cache_put(cache, key, value, size):
+    """放入LRU缓存，超出 size 时丢弃最久未用的项"""
+    cache[key] = value
+    while len(cache) > size:
+        cache.popitem(last=False)
+
+
+class PreviewSource:
+    """一张图片的预览数据（原图、代理图像和预览缓存），只在渲染线程中使用"""
+
+    def __init__(self, path):
+        self.path = path
+        self.image = Image.open(path)  # 只读取文件头，保存时才解码原图
+        self._proxy = None  # 缩小的原图，首次渲染时生成
+        self._originals = collections.OrderedDict()  # (预览宽, 预览高) -> 原图预览
+        self._cache = collections.OrderedDict()  # (像素大小, 模式, 预览宽, 预览高) -> 像素画预览
+
+    @property
+    def proxy(self):
+        if self._proxy is None:
+            # 单独打开文件解码：JPEG按DCT缩放解码（draft），其他格式由 thumbnail 先用 reduce 整数倍缩小
+            with Image.open(self.path) as img:
+                img.draft('RGB', fit_size(img.size, PROXY_SIZE, PROXY_SIZE))
+                img.thumbnail((PROXY_SIZE, PROXY_SIZE), Image.Resampling.BILINEAR, reducing_gap=2.0)
+                self._proxy = img.copy()  # copy 会读完文件，关闭后仍可使用
+        return self._proxy
+
+    def original_preview(self, max_width, max_height):
+        """原图预览（保持宽高比自适应），与像素大小无关，按预览尺寸缓存"""
+        key = (max_width, max_height)
+        preview = self._originals.get(key)
+        if preview is not None:
+            self._originals.move_to_end(key)
+            return preview
+        size = fit_size(self.image.size, max_width, max_height)
+        # 预览比代理图像大时才需要解码原图
+        base = self.proxy if size[0] <= self.proxy.width else self.image
+        preview = base.resize(size, Image.Resampling.LANCZOS)
+        cache_put(self._originals, key, preview, ORIGINAL_CACHE_SIZE)
+        return preview
+
+    def pixel_preview(self, pixel_size, mode, max_width, max_height):
+        """在代理图像上生成预览尺寸的像素画，格子数与原图相同；结果按像素大小、模式和预览尺寸缓存"""
+        key = (pixel_size, mode, max_width, max_height)
+        preview = self._cache.get(key)
+        if preview is not None:
+            self._cache.move_to_end(key)
+            return preview
+
+        grid = pixel_art.pixel_grid(self.image.size, pixel_size)
+        display_size = fit_size(self.image.size, max_width, max_height)
+        # 格子比代理图像的像素还小时像素化已看不出来，直接缩小代理图像
+        small = self.proxy
+        if grid[0] < small.width:
+            small = pixel_art.approximate_pixel_colors(small, grid, mode)
+        # 格子不小于屏幕像素时按最近邻放大保持清晰的边缘
+        resample = Image.Resampling.NEAREST if small.width <= display_size[0] else Image.Resampling.LANCZOS
+        preview = small.resize(display_size, resample)
+
+        cache_put(self._cache, key, preview, PREVIEW_CACHE_SIZE)
+        return preview
+
 
 class PixelArtConverter:
     def __init__(self, root):
@@ -11,15 +109,27 @@ class PixelArtConverter:
 
         # 初始化变量
         self.original_image = None
-        self.processed_image = None
+        self.source = None  # 当前图片的 PreviewSource
+        self.processed_image = None  # 当前显示的像素画预览
         self.pixel_size = 16
+        self.pixel_mode = "mean"
         self.preview_width = 300  # 初始预览宽度
         self.preview_height = 300  # 初始预览高度
 
+        # 后台渲染：图像处理都在渲染线程中进行，结果经队列交回Tk线程
+        self.render_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preview")
+        self.render_results = queue.Queue()
+        self.render_generation = 0  # 最新的渲染请求编号
+        self.shown_generation = 0  # 已显示的渲染请求编号
+        self.render_after = None
+        self.poll_after = None
+        self.saving = False  # 保存是否仍在渲染线程中进行
+
         # 创建UI组件
         self.create_widgets()
         # 绑定窗口大小变化事件
         self.root.bind("<Configure>", self.on_window_resize)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def create_widgets(self):
         # 文件选择按钮
@@ -41,6 +151,12 @@ class PixelArtConverter:
         self.slider_pixel.set(16)
         self.slider_pixel.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
 
+        tk.Label(self.control_frame, text="块颜色:").pack(side=tk.LEFT, padx=5)
+        self.var_mode = tk.StringVar(value=MODE_NAMES[self.pixel_mode])
+        self.menu_mode = tk.OptionMenu(self.control_frame, self.var_mode, *MODE_NAMES.values(),
+                                       command=self.mode_update)
+        self.menu_mode.pack(side=tk.LEFT, padx=5)
+
         # 自适应预览区域（左右分栏）
         self.preview_container = tk.Frame(self.root)
         self.preview_container.pack(pady=10, fill=tk.BOTH, expand=True, padx=20)
@@ -70,8 +186,9 @@ class PixelArtConverter:
             return
 
         try:
-            self.original_image = Image.open(file_path)
-            self.update_preview()  # 首次加载时更新预览
+            self.source = PreviewSource(file_path)
+            self.original_image = self.source.image
+            self.start_render()  # 首次加载时立即渲染
         except Exception as e:
             messagebox.showerror("错误", f"无法打开图片文件: {str(e)}")
 
@@ -87,57 +204,95 @@ class PixelArtConverter:
                 self.update_preview()  # 触发预览更新
 
     def update_preview(self):
-        """更新原图和像素画的预览显示"""
-        if not self.original_image:
+        """安排预览更新：RENDER_DELAY_MS 内的连续请求合并为一次，渲染时使用最新的像素大小和预览尺寸"""
+        if self.source and self.render_after is None:
+            self.render_after = self.root.after(RENDER_DELAY_MS, self.start_render)
+
+    def start_render(self):
+        """提交后台渲染，之前未完成的请求作废"""
+        if self.render_after is not None:
+            self.root.after_cancel(self.render_after)
+            self.render_after = None
+        if not self.source:
             return
+        self.render_generation += 1
+        self.render_executor.submit(self.render_job, self.render_generation, self.source,
+                                    self.pixel_size, self.pixel_mode, self.preview_width, self.preview_height)
+        self.schedule_poll()
 
-        # 处理原图预览（保持宽高比自适应）
-        original_resized = self.resize_image(self.original_image,
-                                             self.preview_width,
-                                             self.preview_height)
-        self.original_tk = ImageTk.PhotoImage(original_resized)
-        self.lbl_original.config(image=self.original_tk)
-
-        # 处理像素画预览
-        self.processed_image = self.generate_pixel_art()
-        if self.processed_image:
-            processed_resized = self.resize_image(self.processed_image,
-                                                  self.preview_width,
-                                                  self.preview_height)
-            self.processed_tk = ImageTk.PhotoImage(processed_resized)
-            self.lbl_processed.config(image=self.processed_tk)
+    def schedule_poll(self):
+        if self.poll_after is None:
+            self.poll_after = self.root.after(POLL_INTERVAL_MS, self.poll_results)
 
-    def resize_image(self, image, max_width, max_height):
-        """调整图片尺寸以适应预览区域（保持宽高比）"""
-        width, height = image.size
-        ratio = min(max_width / width, max_height / height)
-        new_size = (int(width * ratio), int(height * ratio))
-        return image.resize(new_size, Image.Resampling.LANCZOS)
+    def render_job(self, generation, source, pixel_size, mode, width, height):
+        """在渲染线程中生成原图和像素画预览，已被更新的请求取代时跳过"""
+        try:
+            if generation != self.render_generation:
+                return
+            original = source.original_preview(width, height)
+            if generation != self.render_generation:
+                return
+            processed = source.pixel_preview(pixel_size, mode, width, height)
+        except Exception as e:
+            self.render_results.put(("render", generation, None, str(e)))
+            return
+        self.render_results.put(("render", generation, (original, processed), None))
 
-    def generate_pixel_art(self):
-        """生成像素画核心算法"""
-        if not self.original_image:
-            return None
+    def save_job(self, image, pixel_size, mode, file_path):
+        """在渲染线程中按原图分辨率生成并保存像素画"""
+        try:
+            pixel_art.generate_pixel_art(image, pixel_size, mode).save(file_path)
+        except Exception as e:
+            self.render_results.put(("save", None, file_path, str(e)))
+            return
+        self.render_results.put(("save", None, file_path, None))
 
-        original_width, original_height = self.original_image.size
-        target_width = max(1, original_width // self.pixel_size)
-        target_height = max(1, original_height // self.pixel_size)
+    def poll_results(self):
+        """在Tk线程中取回渲染和保存的结果，只显示最新请求的渲染结果"""
+        self.poll_after = None
+        while True:
+            try:
+                kind, generation, result, error = self.render_results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "save":
+                self.saving = False
+                self.btn_save.config(state=tk.NORMAL)
+                if error is None:
+                    messagebox.showinfo("成功", "像素画已保存")
+                else:
+                    messagebox.showerror("错误", f"保存失败: {error}")
+                continue
+            if generation != self.render_generation:
+                continue
+            self.shown_generation = generation
+            if error is not None:
+                messagebox.showerror("错误", f"无法生成预览: {error}")
+                continue
+            original, processed = result
+            self.original_tk = ImageTk.PhotoImage(original)
+            self.lbl_original.config(image=self.original_tk)
+            self.processed_image = processed
+            self.processed_tk = ImageTk.PhotoImage(processed)
+            self.lbl_processed.config(image=self.processed_tk)
+        if self.saving or self.shown_generation != self.render_generation:
+            self.schedule_poll()
 
-        small_image = self.original_image.resize(
-            (target_width, target_height),
-            Image.Resampling.NEAREST
-        )
-        return small_image.resize(
-            (original_width, original_height),
-            Image.Resampling.NEAREST
-        )
+    def on_close(self):
+        self.render_generation += 1  # 作废未完成的渲染
+        self.render_executor.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
 
     def slider_update(self, value):
         """滑块更新时同步数值"""
         self.pixel_size = int(float(value))
         self.var_pixel.set(str(self.pixel_size))
-        if self.original_image:
-            self.update_preview()
+        self.update_preview()
+
+    def mode_update(self, name):
+        """切换块颜色的计算方式"""
+        self.pixel_mode = next(mode for mode, label in MODE_NAMES.items() if label == name)
+        self.update_preview()
 
     def validate_input(self, event):
         """输入框数值验证"""
@@ -155,7 +310,7 @@ class PixelArtConverter:
 
     def save_image(self):
         """保存最终像素画"""
-        if not self.processed_image:
+        if not self.original_image:
             messagebox.showwarning("提示", "请先选择图片并生成像素画")
             return
 
@@ -164,11 +319,12 @@ class PixelArtConverter:
             filetypes=[("PNG文件", "*.png"), ("JPG文件", "*.jpg")]
         )
         if file_path:
-            try:
-                self.processed_image.save(file_path)
-                messagebox.showinfo("成功", "像素画已保存")
-            except Exception as e:
-                messagebox.showerror("错误", f"保存失败: {str(e)}")
+            # 原图只在渲染线程中读取，保存也交给渲染线程，完成后经结果队列通知，不阻塞界面
+            self.saving = True
+            self.btn_save.config(state=tk.DISABLED)
+            self.render_executor.submit(self.save_job, self.original_image, self.pixel_size, self.pixel_mode,
+                                        file_path)
+            self.schedule_poll()
 
 
 if __name__ == "__main__":